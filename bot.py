@@ -5,12 +5,11 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import aiohttp
 import asyncio
 import os
 import re
 import json
-from time import time
+from time import time, monotonic
 from dotenv import load_dotenv
 
 # ----------------------------
@@ -35,63 +34,16 @@ JOURNAL_CHANNEL_ID = 1465271668455899233
 ADMIN_IDS = [
     1289662891578097688,   # 
 ]
-# LOAD BT STATE
+# STATE STORE (SQLite, WAL)
+# BT state, reminder lines, user events and DM sessions.
+# Old JSON files are imported once on first start.
 # ----------------------------------------
 import json
 from datetime import datetime, timedelta
+from modules.state.store import StateStore
 
-BT_STATE_FILE = "bt_state.json"
-
-def load_bt_state():
-    if not os.path.exists(BT_STATE_FILE):
-        # default first-time value
-        return {"last_bt_type": "BT2", "last_bt_date": "1970-01-01"}
-    try:
-        return json.load(open(BT_STATE_FILE, "r"))
-    except:
-        return {"last_bt_type": "BT2", "last_bt_date": "1970-01-01"}
-
-def save_bt_state(bt_type, date_obj):
-    data = {
-        "last_bt_type": bt_type,
-        "last_bt_date": date_obj.strftime("%Y-%m-%d")
-    }
-    json.dump(data, open(BT_STATE_FILE, "w"))
-
-#----------------------------------------
-# LOAD/SAV9E BT LINES
-# ----------------------------------------
-BT_LINES_FILE = "bt_lines.json"
-
-def save_bt_lines(lines):
-    """Store a new set of Qwen-generated lines."""
-    data = {"lines": lines, "index": 0}
-    with open(BT_LINES_FILE, "w") as f:
-        json.dump(data, f)
-
-def load_bt_lines():
-    """Load lines + index. If file missing, return fallback."""
-    if not os.path.exists(BT_LINES_FILE):
-        return {"lines": ["Bear Trap starts in 5 minutes. Prepare squads."], "index": 0}
-
-    try:
-        return json.load(open(BT_LINES_FILE, "r"))
-    except:
-        return {"lines": ["Bear Trap starts in 5 minutes. Prepare squads."], "index": 0}
-
-def get_next_bt_line():
-    """Fetch next line in rotation and update index."""
-    data = load_bt_lines()
-    lines = data["lines"]
-    idx = data.get("index", 0)
-
-    line = lines[idx % len(lines)]
-    data["index"] = (idx + 1) % len(lines)
-
-    with open(BT_LINES_FILE, "w") as f:
-        json.dump(data, f)
-
-    return line
+state_store = StateStore("blt_state.db")
+state_store.migrate_json()
 
 # ----------------------------------------
 # FILEWATCH LOG CONFIG
@@ -102,17 +54,19 @@ FILEWATCH_STATE = "/data/data/com.termux/files/home/blt_bot/filewatch_state.txt"
 # ----------------------------------------
 # MEMORY SYSTEM
 # ----------------------------------------
+# Append-only turn log per user (chat_memory/<uid>/), compacted in the background
+from modules.chat.memlog import ChatLog
+from modules.state.aio import bot_io, GroupCommit
+
 MEMORY_DIR = "chat_memory"
-os.makedirs(MEMORY_DIR, exist_ok=True)
 
-def mem_path(uid):
-    return os.path.join(MEMORY_DIR, f"{uid}.txt")
+chat_log = ChatLog(MEMORY_DIR)
 
-def load_mem(uid):
-    p = mem_path(uid)
-    if os.path.exists(p):
-        return open(p, "r", encoding="utf-8").read()
-    return ""
+def _append_turns(uid, batches):
+    # Several saves for one user in the commit window → one append + fsync
+    chat_log.append(uid, [turn for turns in batches for turn in turns])
+
+mem_commit = GroupCommit(bot_io, _append_turns)
 
 # ================================================
 # DM MEMORY WHITELIST (MadOS-safe categories)
@@ -126,7 +80,40 @@ MEMORY_WHITELIST = [
     "doctrine", "principles", "mados method", "clarity-before-action",
 ]
 
-def save_mem(uid, user_msg, bot_msg, force=False):
+# Only the stored exchanges relevant to the current message go into the prompt
+from modules.chat.retrieval import MemoryRetriever, MEMORY_TOKEN_BUDGET
+from modules.llm.tokens import estimate_tokens
+
+memory_recall = MemoryRetriever(chat_log, bot_io, topics=MEMORY_WHITELIST)
+
+# Oldest turns are folded into a rolling summary while the LLM is idle
+from modules.chat.summarize import MemorySummarizer
+
+async def _summarize_memory(prompt):
+    out = await ask_qwen(prompt, skip_system=True, priority=BACKGROUND,
+                         caller="memory_summary", profile="memory")
+    return out if qwen_ok(out) else None
+
+async def _llm_idle():
+    return await pregen.is_idle()
+
+memory_summaries = MemorySummarizer(chat_log, bot_io, _summarize_memory, _llm_idle)
+
+async def load_mem(uid, query, qvec=None, budget=MEMORY_TOKEN_BUDGET):
+    """
+    (summary, recalled) for the DM prompt. The rolling summary only changes
+    when the background job folds in more turns, so it stays in the cached
+    prefix; recalled exchanges differ per message and go next to "User:".
+    """
+    summary = await memory_summaries.text_for(uid)
+    summary_tokens = estimate_tokens(summary) if summary else 0
+    if summary_tokens > budget // 2:
+        # Tight (degraded) budget: relevant exchanges beat the overview
+        summary, summary_tokens = "", 0
+    recalled = await memory_recall.recall(uid, query, qvec=qvec, budget=budget - summary_tokens)
+    return (f"Earlier conversations (summary): {summary}\n" if summary else ""), recalled
+
+async def save_mem(uid, user_msg, bot_msg, force=False):
     import re
 
     # -------------------------
@@ -163,34 +150,18 @@ def save_mem(uid, user_msg, bot_msg, force=False):
         return
 
     # -------------------------
-    # 2. Forced save
+    # 2. Forced save (appended; old turns are kept, not chopped)
     # -------------------------
-    p = mem_path(uid)
-    old = load_mem(uid)
-
-    entry = f"User: {user_msg}\nBot: {bot_msg}\n"
-    new = old + entry
-
-    # keep last ~2000 chars
-    with open(p, "w", encoding="utf-8") as f:
-        f.write(new[-2000:])
+    turns = [("user", user_msg), ("bot", bot_msg)]
+    await mem_commit.submit(uid, turns)
+    memory_recall.note(uid, turns)
 
 # ----------------------------------------
-# DM ACTIVE MEMORY
+# DM SESSIONS (in memory, written behind to the state store)
 # ----------------------------------------
-DM_ACTIVE_FILE = "dm_active.json"
+from modules.chat.sessions import SessionManager
 
-def load_dm_active():
-    if not os.path.exists(DM_ACTIVE_FILE):
-        return {}
-    try:
-        return json.load(open(DM_ACTIVE_FILE, "r"))
-    except:
-        return {}
-
-def save_dm_active(data):
-    with open(DM_ACTIVE_FILE, "w") as f:
-        json.dump(data, f)
+dm_sessions = SessionManager(state_store)
 
 PROMPT_FILE = "system_prompt.txt"
 
@@ -221,26 +192,76 @@ def load_mad_identity():
 
 CHAT_IDENTITY = load_mad_identity() + "\n\n"
 
+# ----------------------------------------
+# SHARED HTTP POOL (llama-server + local_api)
+# ----------------------------------------
+from modules.llm.client import (
+    LOCAL_API_URL, LOCAL_API_TIMEOUT,
+    post_json, start_session, close_session,
+)
+from modules.llm.stream import stream_to_channel
+from modules.llm.scheduler import (
+    llm_scheduler, SchedulerBusy, INTERACTIVE, COMMAND, BACKGROUND,
+)
+
+from modules.llm.slots import dm_slots
+from modules.llm.tokens import fit_segments, PROMPT_BUDGET
+from modules.llm.singleflight import completion_flight, payload_key
+from modules.llm.metrics import llm_metrics
+
+from modules.llm.health import local_api_breaker, health_loop, CircuitOpen
+from modules.llm.pool import llm_pool
+from modules.llm.router import route_task, all_pools, MAIN
+
+from modules.llm.pregen import PregenEngine, PregenStore
+from modules.llm.profiles import profile_params
+from modules.llm.kvstate import KVState
+from modules.llm.semantic import dm_cache, MAX_QUESTION_CHARS
+from modules.llm.degrade import (
+    load_governor, DEGRADED_PROFILE, DEGRADED_PROMPT_BUDGET, DEGRADED_MEMORY_BUDGET, DEGRADED_NOTE
+)
+
+QWEN_BUSY_REPLY = "⏳ Qwen is busy with other requests — try again in a minute."
+QWEN_DOWN_REPLY = "🛠️ Qwen is offline or still loading its model — try again shortly."
+
+def qwen_ok(text):
+    """False for empty output and the error/busy/offline strings ask_qwen returns."""
+    return bool(text) and not text.startswith("⚠️") and text not in (QWEN_BUSY_REPLY, QWEN_DOWN_REPLY)
+
+# Scheduled content generated ahead of time while llama-server is idle
+PREGEN_FILE = "pregen.json"
+pregen = PregenEngine(PregenStore(PREGEN_FILE))
+
+# llama-server KV slots (+ DM user pins) saved on a timer / shutdown, restored at boot
+kv_state = KVState(pins=dm_slots, pins_path="dm_slots.json")
+
 # ----------------------------------------
 # THINKING API (Local)
 # ----------------------------------------
-async def ask_local(prompt):
+async def ask_local(prompt, mode="general"):
+    # local_api down → skip enrichment instead of waiting on a connect
+    if not local_api_breaker.allow():
+        return prompt
     try:
-        async with aiohttp.ClientSession() as s:
-            async with s.post("http://127.0.0.1:5005/think", json={"prompt": prompt}) as r:
-                j = await r.json()
-                return j.get("prompt_for_qwen", prompt)
-    except:
+        raw = await post_json(
+            f"{LOCAL_API_URL}/think", {"prompt": prompt, "mode": mode},
+            timeout=LOCAL_API_TIMEOUT
+        )
+        out = json.loads(raw).get("prompt_for_qwen", prompt)
+        local_api_breaker.record_success()
+        return out
+    except Exception as e:
+        local_api_breaker.record_failure(e)
         return prompt
 
 # ----------------------------------------
-# QWEN COMPLETION (with stop override, FIXED)
+# QWEN PAYLOAD BUILDER
 # ----------------------------------------
-async def ask_qwen(user_prompt, use_chat_identity=False, skip_system=False):
-    print("===== ENTER ASK_QWEN =====")
-    print("user_prompt:", repr(user_prompt))
+def build_qwen_payload(user_prompt, use_chat_identity=False, skip_system=False,
+                       memory="", slot_id=None, profile="chat-fast", recall=""):
     print("use_chat_identity =", use_chat_identity)
     print("skip_system =", skip_system)
+    print("profile =", profile)
 
     # ========== MODE 1: DIARY (raw model, no identity) ==========
     if skip_system:
@@ -249,9 +270,13 @@ async def ask_qwen(user_prompt, use_chat_identity=False, skip_system=False):
         stop_tokens = ["</s>", "The conclusion forms quietly."]
 
     # ========== MODE 2: CHAT / DM CHAT (identity persona) ==========
+    # Identity + memory (the rolling summary) is byte-identical between
+    # turns, so a pinned slot keeps it cached. `recall` is picked per
+    # message and sits after it, next to the "User:" line: only those
+    # tokens (≤ MEMORY_TOKEN_BUDGET) are evaluated again each turn.
     elif use_chat_identity:
-        full_prompt = f"{CHAT_IDENTITY}\nUser: {user_prompt}"
-        cache_flag = False
+        full_prompt = f"{CHAT_IDENTITY}{memory}{recall}\nUser: {user_prompt}"
+        cache_flag = True
         stop_tokens = ["</s>", "User:"]
 
     # ========== MODE 3: NORMAL SYSTEM PROMPT ==========
@@ -261,26 +286,73 @@ async def ask_qwen(user_prompt, use_chat_identity=False, skip_system=False):
         stop_tokens = ["</s>", "User:"]
 
     # ======== QWEN PAYLOAD ========
+    # n_predict + sampling come from the generation profile (modules/llm/profiles.py)
     payload = {
         "prompt": full_prompt,
         "system": "",
-        "n_predict": 350,
-        "temperature": 0.48,
-        "top_k": 40,
-        "top_p": 0.92,
-        "min_p": 0.06,
-        "repeat_penalty": 1.12,
         "cache_prompt": cache_flag,
-        "stop": stop_tokens,
+        **profile_params(profile, stop=stop_tokens),
     }
+    if slot_id is not None:
+        payload["id_slot"] = slot_id
 
     print("===== QWEN PAYLOAD SENT =====")
     print(payload)
 
+    return payload
+
+# ----------------------------------------
+# TOKEN BUDGET (DM chat)
+# ----------------------------------------
+async def fit_chat_inputs(user_msg, memory, recall="", budget=PROMPT_BUDGET):
+    """
+    Fit identity, the user's message, the summary and recalled exchanges
+    into the slot's prompt budget, in that priority order. Recall is cut
+    first (keeping its most recent tail), so the cached summary prefix
+    stays intact.
+    """
+    parts = await fit_segments([
+        {"name": "identity", "text": CHAT_IDENTITY, "keep": "head"},
+        {"name": "user", "text": user_msg, "keep": "head"},
+        {"name": "memory", "text": memory, "keep": "head"},
+        {"name": "recall", "text": recall, "keep": "tail"},
+    ], budget)
+    return parts["user"], parts["memory"], parts["recall"]
+
+# ----------------------------------------
+# QWEN COMPLETION (with stop override, FIXED)
+# ----------------------------------------
+async def ask_qwen(user_prompt, use_chat_identity=False, skip_system=False, priority=COMMAND,
+                   caller="command", profile="chat-fast"):
+    print("===== ENTER ASK_QWEN =====")
+    print("user_prompt:", repr(user_prompt))
+
+    payload = build_qwen_payload(user_prompt, use_chat_identity, skip_system, profile=profile)
+
+    # Utility tasks may go to the small model (LLM_TASK_ROUTES in config)
+    model, pool, scheduler = route_task(caller)
+    label = caller if model == MAIN else f"{caller}@{model}"
+
+    async def scheduled_post():
+        t0 = monotonic()
+        async with scheduler.slot(priority) as queue_s:
+            # Routed to the least-busy healthy instance; retried once elsewhere
+            _, raw = await pool.post("/completion", payload)
+
+        try:
+            timings = json.loads(raw).get("timings")
+        except:
+            timings = None
+        llm_metrics.record_completion(label, queue_s, monotonic() - t0, timings)
+        return raw
+
+    # Fail fast while every llama-server is down or loading
+    if not pool.available():
+        return QWEN_DOWN_REPLY
+
     try:
-        async with aiohttp.ClientSession() as s:
-            async with s.post("http://127.0.0.1:8080/completion", json=payload) as r:
-                raw = await r.text()
+        # Identical concurrent prompts (e.g. everyone running /bt) share one generation
+        raw = await completion_flight.do(payload_key(dict(payload, model=model)), scheduled_post)
 
         try:
             data = json.loads(raw)
@@ -295,18 +367,112 @@ async def ask_qwen(user_prompt, use_chat_identity=False, skip_system=False):
             or ""
         ).strip()
 
-        return txt
+        return txt or "⚠️ Qwen error: empty response"
 
+    except SchedulerBusy:
+        return QWEN_BUSY_REPLY
+    except CircuitOpen:
+        return QWEN_DOWN_REPLY
     except Exception as e:
         return f"⚠️ Qwen error: {e}"
 
+# ----------------------------------------
+# QWEN STREAMING (edits a Discord message as tokens arrive)
+# ----------------------------------------
+async def ask_qwen_stream(channel, user_prompt, use_chat_identity=False, skip_system=False,
+                          priority=INTERACTIVE, memory="", slot_index=None, caller="dm",
+                          profile="chat-deep", footer="", recall=""):
+    print("===== ENTER ASK_QWEN_STREAM =====")
+    print("user_prompt:", repr(user_prompt))
+
+    # Sticky: a pinned session goes to the instance + slot holding its cache
+    prefer, slot_id = (None, None) if slot_index is None else llm_pool.slot_target(slot_index)
+
+    payload = build_qwen_payload(
+        user_prompt, use_chat_identity, skip_system, memory=memory, slot_id=slot_id,
+        profile=profile, recall=recall
+    )
+
+    if not llm_pool.available():
+        await channel.send(QWEN_DOWN_REPLY)
+        return ""
+
+    t0 = monotonic()
+    stats = {}
+    try:
+        async with llm_scheduler.slot(priority) as queue_s:
+            # Streams are not retried: tokens may already be on screen
+            backend, payload = llm_pool.route(payload, prefer=prefer)
+            if backend is None:
+                await channel.send(QWEN_DOWN_REPLY)
+                return ""
+            backend.outstanding += 1
+            try:
+                out = await stream_to_channel(
+                    channel, f"{backend.url}/completion", payload, stats, footer=footer
+                )
+            except asyncio.CancelledError:
+                # No verdict on the backend: free a half-open trial it may hold
+                backend.breaker.release_trial()
+                raise
+            finally:
+                backend.outstanding -= 1
+    except SchedulerBusy:
+        await channel.send(QWEN_BUSY_REPLY)
+        return ""
+
+    if not out or out.startswith("⚠️ Qwen error"):
+        # Nothing streamed ("(no response)") counts against the backend too
+        backend.failed += 1
+        backend.breaker.record_failure(out or "empty stream")
+    else:
+        backend.served += 1
+        backend.breaker.record_success()
+        ttft = stats.get("ttft")
+        llm_metrics.record_completion(
+            caller, queue_s, monotonic() - t0, stats.get("timings"),
+            ttft_s=None if ttft is None else queue_s + ttft,
+        )
+    return out
+
 # ----------------------------------------
 # DISCORD SETUP
 # ----------------------------------------
 intents = discord.Intents.default()
 intents.message_content = True
 
-client = discord.Client(intents=intents)
+class BLTClient(discord.Client):
+    async def setup_hook(self):
+        # One keep-alive pool for the whole bot lifetime
+        await start_session()
+        # Admit as many concurrent generations as the backend pool has slots
+        llm_scheduler.max_concurrent = llm_pool.total_slots()
+        self.health_task = asyncio.create_task(health_loop())
+        self.pregen_task = asyncio.create_task(pregen.loop())
+        # Restore saved slots (or pre-fill the identity prefix) before the first DM
+        self.kv_task = asyncio.create_task(kv_state.loop(CHAT_IDENTITY))
+        self.sessions_task = asyncio.create_task(dm_sessions.loop())
+        self.memlog_task = asyncio.create_task(chat_log.loop())
+        self.summary_task = asyncio.create_task(memory_summaries.loop())
+
+    async def close(self):
+        for name in ("health_task", "pregen_task", "kv_task", "sessions_task", "memlog_task",
+                     "summary_task"):
+            task = getattr(self, name, None)
+            if task:
+                task.cancel()
+        await super().close()
+        await mem_commit.drain()
+        dm_sessions.flush_sync()
+        try:
+            await kv_state.save_all()
+        except Exception as e:
+            print("[KV] shutdown snapshot failed:", e)
+        await close_session()
+        state_store.close()
+        bot_io.close()
+
+client = BLTClient(intents=intents)
 tree = app_commands.CommandTree(client)
 
 LAST = {}
@@ -431,7 +597,7 @@ async def remember_cmd(interaction: discord.Interaction, text: str):
     uid = interaction.user.id
 
     # Explicit save, bypassing filters
-    save_mem(uid, text, "(memory saved)", force=True)
+    await save_mem(uid, text, "(memory saved)", force=True)
 
     # --- Confirm ---
     await interaction.followup.send(
@@ -471,7 +637,7 @@ async def remind_event_cmd(
     await interaction.response.defer(ephemeral=True)
 
     # --- SAVE EVENT ---
-    schedule_user_event(message, hhmm, minutes_before)
+    await schedule_user_event(message, hhmm, minutes_before)
 
     # --- CONFIRMATION ---
     await interaction.followup.send(
@@ -497,9 +663,7 @@ async def chat_cmd(interaction: discord.Interaction):
     uid = interaction.user.id
 
     # ---- ENABLE DM CHAT ----
-    data = load_dm_active()      # load existing DM states (JSON)
-    data[str(uid)] = True        # mark this user as active DM session
-    save_dm_active(data)         # save back to file
+    dm_sessions.activate(uid, mode="chat")
 
     # ---- OPEN DM ----
     dm = await interaction.user.send(
@@ -513,23 +677,7 @@ async def chat_cmd(interaction: discord.Interaction):
         ephemeral=True
     )
 	
-@tree.command(
-    name="bt_generate_lines",
-    description="Generate Bear Trap reminder lines for the 5-minute warning (DM only)."
-)
-async def bt_generate_lines(interaction: discord.Interaction):
-
-    # --- DM ONLY CHECK ---
-    if not isinstance(interaction.channel, discord.DMChannel):
-        return await interaction.response.send_message(
-            "📬 Use this command in **DM with me**.",
-            ephemeral=True
-        )
-
-    # Acknowledge early
-    await interaction.response.defer(ephemeral=True)
-
-    prompt = """
+BT_LINES_PROMPT = """
 You are BLT-bot (MadOS Fork).
 Generate 5 short tactical reminder lines for the Bear Trap event,
 specifically for the FIVE-MINUTE reminder.
@@ -544,7 +692,9 @@ REQUIREMENTS:
 - Output lines numbered 1–5.
 """
 
-    text = await ask_qwen(prompt, skip_system=True)
+async def generate_bt_lines(priority=COMMAND):
+    text = await ask_qwen(BT_LINES_PROMPT, skip_system=True, priority=priority,
+                          caller="bt_generate_lines", profile="lines")
 
     # Parse into clean list
     lines = []
@@ -554,8 +704,29 @@ REQUIREMENTS:
             line = stripped.split(". ", 1)[-1]
             lines.append(line)
 
+    return lines
+
+@tree.command(
+    name="bt_generate_lines",
+    description="Generate Bear Trap reminder lines for the 5-minute warning (DM only)."
+)
+async def bt_generate_lines(interaction: discord.Interaction):
+
+    # --- DM ONLY CHECK ---
+    if not isinstance(interaction.channel, discord.DMChannel):
+        return await interaction.response.send_message(
+            "📬 Use this command in **DM with me**.",
+            ephemeral=True
+        )
+
+    # Acknowledge early
+    await interaction.response.defer(ephemeral=True)
+
+    # Pre-generated batch if one is ready, live generation otherwise
+    lines = await bot_io.run(pregen.take, "bt_lines") or await generate_bt_lines()
+
     # Save lines
-    save_bt_lines(lines)
+    await save_bt_lines(lines)
 
     await interaction.followup.send(
         f"📝 **Stored {len(lines)} new Bear Trap reminder lines.**\n"
@@ -581,9 +752,7 @@ async def deepchat_cmd(interaction: discord.Interaction):
     uid = interaction.user.id
 
     # ---- ACTIVATE DM SESSION ----
-    data = load_dm_active()
-    data[str(uid)] = True
-    save_dm_active(data)
+    dm_sessions.activate(uid, mode="deepchat")
 
     # ---- SEND DM ----
     await interaction.user.send(
@@ -605,7 +774,7 @@ async def delete_event_cmd(interaction: discord.Interaction, index: int):
     if interaction.user.id not in ADMIN_IDS:
         return await interaction.response.send_message("⛔ No permission.", ephemeral=True)
 
-    events = load_events()
+    events = await load_events()
 
     if index < 1 or index > len(events):
         return await interaction.response.send_message(
@@ -613,8 +782,8 @@ async def delete_event_cmd(interaction: discord.Interaction, index: int):
             ephemeral=True
         )
 
-    evt = events.pop(index - 1)
-    save_events(events)
+    evt = events[index - 1]
+    await state_store.delete_event(evt["id"])
 
     await interaction.response.send_message(
         f"🗑️ Deleted event #{index}:\n**{evt['message']}** at {evt['hhmm']}",
@@ -629,7 +798,7 @@ async def list_events_cmd(interaction: discord.Interaction):
     if interaction.user.id not in ADMIN_IDS:
         return await interaction.response.send_message("⛔ No permission.", ephemeral=True)
 
-    events = load_events()
+    events = await load_events()
     if not events:
         return await interaction.response.send_message("📭 No scheduled events.", ephemeral=True)
 
@@ -639,23 +808,185 @@ async def list_events_cmd(interaction: discord.Interaction):
 
     await interaction.response.send_message(message, ephemeral=True)
 
-import discord
+@tree.command(
+    name="llmqueue",
+    description="Show LLM scheduler queue and wait times (admin only)."
+)
+async def llm_queue_cmd(interaction: discord.Interaction):
+    if interaction.user.id not in ADMIN_IDS:
+        return await interaction.response.send_message("⛔ No permission.", ephemeral=True)
+
+    message = "**🧮 LLM Scheduler:**\n"
+    for name, st in llm_scheduler.stats().items():
+        message += (
+            f"- **{name}**: active {st['active']}, queued {st['queued']}, "
+            f"served {st['served']}, rejected {st['rejected']}, "
+            f"wait p50 `{st['wait_p50_ms']}ms` / p95 `{st['wait_p95_ms']}ms`"
+            + (f", waited on other processes {st['lease_waits']}×" if st.get("lease_waits") else "")
+            + "\n"
+        )
+    message += f"- **DM users per slot**: {dm_slots.load()}\n"
+    for model, pool in all_pools():
+        for b in pool.stats():
+            message += (
+                f"- **{model}/llama:{b['name']}**: `{b['state']}`, outstanding {b['outstanding']}/{b['slots']}, "
+                f"served {b['served']}, failed {b['failed']}\n"
+            )
+    br = local_api_breaker
+    message += f"- **{br.name}**: `{br.state}` {br.last_error if br.is_open() else ''}\n"
+    fl = completion_flight.stats()
+    message += f"- **Coalesced**: {fl['deduped']} of {fl['calls']} calls shared an in-flight generation\n"
+    kv = kv_state.stats()
+    message += (
+        f"- **KV slots**: saved {kv['saved']} ({kv['unchanged']} skipped unchanged), restored {kv['restored']}, warmed {kv['warmed']}"
+        + (f", unsupported on {', '.join(kv['unsupported'])}" if kv["unsupported"] else "") + "\n"
+    )
+    ld = load_governor.stats()
+    tps = "–" if ld["tps_p50"] is None else f"{ld['tps_p50']:.1f} t/s"
+    if ld["slow_below"] is not None:
+        tps += f" (slow < {ld['slow_below']:.1f})"
+    message += (
+        f"- **Load tier**: `{ld['state']}` for {ld['for_s']}s ({ld['switches']} switches), "
+        f"queued {ld['queued']}, wait p95 `{ld['wait_p95_ms']:.0f}ms`, gen p50 `{tps}`\n"
+    )
+
+    await interaction.response.send_message(message, ephemeral=True)
+
+@tree.command(
+    name="llmstats",
+    description="Show LLM latency p50/p95 per caller and model (admin only)."
+)
+async def llm_stats_cmd(interaction: discord.Interaction):
+    if interaction.user.id not in ADMIN_IDS:
+        return await interaction.response.send_message("⛔ No permission.", ephemeral=True)
+
+    summary = llm_metrics.summary()
+    if not summary:
+        return await interaction.response.send_message("📭 No LLM calls recorded yet.", ephemeral=True)
+
+    def fmt(pair, unit):
+        if pair is None:
+            return "–"
+        return f"{pair[0]:.0f}/{pair[1]:.0f}{unit}"
+
+    message = "**⏱️ LLM latency (p50/p95):**\n"
+    for caller, row in summary.items():
+        message += (
+            f"- **{caller}** ×{row['count']}: "
+            f"queue `{fmt(row['queue_ms'], 'ms')}`, "
+            f"ttft `{fmt(row['ttft_ms'], 'ms')}`, "
+            f"prompt `{fmt(row['prompt_ms'], 'ms')}`, "
+            f"gen `{fmt(row['gen_tps'], ' t/s')}`, "
+            f"total `{fmt(row['total_ms'], 'ms')}`\n"
+        )
+
+    sc = dm_cache.stats()
+    if sc["enabled"]:
+        message += (
+            f"\n**🧠 DM cache:** {sc['hits']}/{sc['lookups']} hits ({sc['hit_rate']:.0%}), "
+            f"{sc['size']} answers, ~{sc['saved_s']}s generation saved, "
+            f"{sc['embed_failures']} embedding failures\n"
+        )
+
+    mr = memory_recall.stats()
+    message += (
+        f"**📚 Memory recall:** {mr['recalls']} recalls, {mr['avg_selected']} exchanges avg, "
+        f"{mr['indexes']} indexes ({mr['docs']} exchanges), {mr['reranked']} re-ranked\n"
+    )
+    ms = memory_summaries.stats()
+    message += (
+        f"**🗜️ Memory summaries:** {ms['runs']} runs, {ms['turns_folded']} turns folded, "
+        f"{ms['failed']} failed, {ms['skipped_busy']} skipped (busy)\n"
+    )
+
+    await interaction.response.send_message(message[:1900], ephemeral=True)
+
+# ----------------------------------------
+# ALLIANCE COMMANDS (/bt /kvk /vikings /calendar)
+# ----------------------------------------
+from modules.alliance.summaries import build_summary, plain_timestamps
+from modules.llm.cache import TTLCache, make_key
+
+FLOURISH_PROMPTS = {
+    "bt": "Write a short rally-leader style recap of this Bear Trap result.",
+    "kvk": "Write a short KvK briefing for the alliance from these notes.",
+    "vikings": "Write a short Vikings recap for the alliance from these notes.",
+    "calendar": "Write a short reminder of the upcoming BLT events.",
+}
+
+alliance_cache = TTLCache(maxsize=32)
+
+async def alliance_cmd(interaction, mode, flourish=False):
+    """
+    Answers straight from bot_data (no LLM, works while llama-server is
+    busy or down). Qwen is only asked for a narrative on `flourish`.
+    """
+    try:
+        summary = await bot_io.run(build_summary, mode, datetime.now(dt_timezone.utc))
+    except Exception as e:
+        print(f"[ALLIANCE] {mode} summary failed:", e)
+        summary = "⚠️ Could not read alliance data."
+
+    await interaction.response.send_message(summary[:1900])
+
+    if not flourish:
+        return
+
+    # The summary depends on bot_data *and* the clock (next weekly event),
+    # so the narrative is keyed on the text it was written from. Timestamps
+    # go in as plain UTC times: the model cannot read <t:…> markup.
+    facts = plain_timestamps(summary)
+    key = make_key(mode, facts)
+
+    # Same facts → reuse the last narrative
+    cached = alliance_cache.get(key)
+    if cached is not None:
+        return await interaction.followup.send(cached[:1900])
+
+    if cooldown(interaction.user.id):
+        return await interaction.followup.send("Cooldown.", ephemeral=True)
+
+    request = "Alliance request:\n" + FLOURISH_PROMPTS[mode] + "\n\n" + facts
+
+    # Under load: no local_api round trip, shorter narrative, not cached
+    if load_governor.degraded():
+        out = await ask_qwen(request, caller="alliance", profile=DEGRADED_PROFILE)
+        return await interaction.followup.send(out[:1800] + (DEGRADED_NOTE if qwen_ok(out) else ""))
+
+    enriched = await ask_local(request, mode=mode)
+    out = await ask_qwen(enriched, caller="alliance")
+
+    if qwen_ok(out):
+        alliance_cache.set(key, out)
+
+    await interaction.followup.send(out[:1900])
 
-@tree.command(name="bt")
-async def bt_cmd(interaction):
-    await alliance_cmd(interaction, "Provide latest Bear Trap summary.")
+@tree.command(
+    name="clearcache",
+    description="Drop cached /bt /kvk /vikings /calendar narratives and DM answers (admin only)."
+)
+async def clear_cache_cmd(interaction: discord.Interaction):
+    if interaction.user.id not in ADMIN_IDS:
+        return await interaction.response.send_message("⛔ No permission.", ephemeral=True)
 
-@tree.command(name="kvk")
-async def kvk_cmd(interaction):
-    await alliance_cmd(interaction, "Provide KvK update.")
+    n = alliance_cache.clear() + dm_cache.clear()
+    await interaction.response.send_message(f"🧹 Cleared {n} cached answers.", ephemeral=True)
 
-@tree.command(name="vikings")
-async def vikings_cmd(interaction):
-    await alliance_cmd(interaction, "Provide Vikings summary.")
+@tree.command(name="bt", description="Latest Bear Trap result and top players.")
+async def bt_cmd(interaction: discord.Interaction, flourish: bool = False):
+    await alliance_cmd(interaction, "bt", flourish)
 
-@tree.command(name="calendar")
-async def calendar_cmd(interaction):
-    await alliance_cmd(interaction, "Provide BLT event calendar.")
+@tree.command(name="kvk", description="KvK notes and next KvK.")
+async def kvk_cmd(interaction: discord.Interaction, flourish: bool = False):
+    await alliance_cmd(interaction, "kvk", flourish)
+
+@tree.command(name="vikings", description="Vikings notes and next Vikings.")
+async def vikings_cmd(interaction: discord.Interaction, flourish: bool = False):
+    await alliance_cmd(interaction, "vikings", flourish)
+
+@tree.command(name="calendar", description="Upcoming BLT events.")
+async def calendar_cmd(interaction: discord.Interaction, flourish: bool = False):
+    await alliance_cmd(interaction, "calendar", flourish)
 
 @client.event
 async def on_message(message):
@@ -706,23 +1037,54 @@ async def on_message(message):
     if not isinstance(message.channel, discord.DMChannel):
         return
 
-    dm_active = load_dm_active()
-
-    # If user has not activated DM chat mode → ignore
-    if str(uid) not in dm_active or not dm_active[str(uid)]:
+    # If user has not activated DM chat mode → ignore (memory lookup, no disk I/O)
+    if dm_sessions.get(uid) is None:
         return
 
     # Ignore screenshots during normal DM chat
     if message.attachments:
         return
 
+    dm_sessions.touch(uid)
+
     # --- Normal MadOS DM chat handling ---
-    mem = load_mem(uid)
-    prompt = CHAT_IDENTITY + mem + f"\nUser: {message.content}"
-    out = await ask_qwen(prompt, use_chat_identity=True)
+    # Repeated questions ("when is bear trap") reuse a recent answer
+    qvec = None
+    if dm_cache.enabled() and len(message.content) <= MAX_QUESTION_CHARS:
+        qvec = await dm_cache.embed(message.content)
+        if qvec is not None:
+            cached, sim = dm_cache.lookup(qvec, owner=str(uid))
+            if cached is not None:
+                print(f"[SEMCACHE] Hit for {uid} (similarity {sim:.3f})")
+                await message.channel.send(cached[:1900])
+                await save_mem(uid, message.content, cached)
+                return
+
+    # Under load: shorter reply + trimmed memory keeps the queue moving
+    degraded = load_governor.degraded()
+    summary, recalled = await load_mem(
+        uid, message.content, qvec=None if degraded else qvec,
+        budget=DEGRADED_MEMORY_BUDGET if degraded else MEMORY_TOKEN_BUDGET
+    )
+    user_msg, mem, recall = await fit_chat_inputs(
+        message.content, summary, recalled,
+        budget=DEGRADED_PROMPT_BUDGET if degraded else PROMPT_BUDGET
+    )
+    t0 = monotonic()
+    out = await ask_qwen_stream(
+        message.channel, user_msg, use_chat_identity=True,
+        memory=mem, recall=recall, slot_index=dm_slots.slot_for(uid),
+        profile=DEGRADED_PROFILE if degraded else "chat-deep",
+        footer=DEGRADED_NOTE if degraded else ""
+    )
 
-    save_mem(uid, message.content, out)
-    await message.channel.send(out[:1900])
+    # Short degraded replies are not worth serving again. An answer that saw
+    # this user's memory (summary / recalled turns) is only reused for them.
+    if qvec is not None and not degraded and qwen_ok(out):
+        dm_cache.add(qvec, message.content, out, monotonic() - t0,
+                     owner=str(uid) if (mem.strip() or recall.strip()) else None)
+
+    await save_mem(uid, message.content, out)
 
 # ======================================
 # BT REMINDER SYSTEM — CLEAN + INTEGRATED
@@ -732,91 +1094,44 @@ import json
 from datetime import datetime, timedelta
 from datetime import timezone as dt_timezone
 
-BT_STATE_FILE = "bt_state.json"
-
-def load_bt_state():
-    if not os.path.exists(BT_STATE_FILE):
-        return {"last_bt_type": "BT1", "last_bt_date": None}
-    try:
-        return json.load(open(BT_STATE_FILE, "r"))
-    except:
-        return {"last_bt_type": "BT1", "last_bt_date": None}
+async def load_bt_state():
+    return await state_store.get_bt_state()
 
-def save_bt_state(new_type, date):
-    with open(BT_STATE_FILE, "w") as f:
-        json.dump({
-            "last_bt_type": new_type,
-            "last_bt_date": str(date)
-        }, f)
+async def save_bt_state(new_type, date):
+    await state_store.set_bt_state(new_type, date)
 
 # --------------------------------------
 # CONSTANTS
 # --------------------------------------
 BT1_TIME = "22:30"
 BT2_TIME = "14:00"
-BT_LINES_FILE = "bt_lines.json"
-USER_EVENTS_FILE = "events.json"
 
 _last_sent_key = None  # Prevent double-fire
 
 # --------------------------------------
 # USER EVENT STORAGE
 # --------------------------------------
-def load_events():
-    if not os.path.exists(USER_EVENTS_FILE):
-        return []
-    try:
-        return json.load(open(USER_EVENTS_FILE, "r"))
-    except:
-        return []
-
-def save_events(events):
-    with open(USER_EVENTS_FILE, "w") as f:
-        json.dump(events, f, indent=2)
+async def load_events():
+    """[{id, message, hhmm, minutes_before, sent_for_date}] in creation order."""
+    return await state_store.list_events()
 
 # ======================================
 # USER EVENT SCHEDULER
 # ======================================
-def schedule_user_event(message, hhmm, minutes_before):
-    events = load_events()
-    events.append({
-        "message": message,
-        "hhmm": hhmm,
-        "minutes_before": minutes_before,
-        "sent_for_date": None
-    })
-
-    save_events(events)
-    print("[EVENT] Saved user event:", events[-1])
+async def schedule_user_event(message, hhmm, minutes_before):
+    event_id = await state_store.add_event(message, hhmm, minutes_before)
+    print(f"[EVENT] Saved user event #{event_id}: {message} at {hhmm} (−{minutes_before}min)")
 
 # --------------------------------------
 # BT LINES STORAGE
 # --------------------------------------
-def save_bt_lines(lines):
-    data = {"lines": lines, "index": 0}
-    with open(BT_LINES_FILE, "w") as f:
-        json.dump(data, f)
-
-def load_bt_lines():
-    if not os.path.exists(BT_LINES_FILE):
-        return {"lines": ["Bear Trap in 5 minutes. Prepare squads."], "index": 0}
-    try:
-        return json.load(open(BT_LINES_FILE, "r"))
-    except:
-        return {"lines": ["Bear Trap in 5 minutes. Prepare squads."], "index": 0}
-
-def get_next_bt_line():
-    data = load_bt_lines()
-    lines = data["lines"]
-    idx = data.get("index", 0)
-
-    line = lines[idx % len(lines)]
-    data["index"] = (idx + 1) % len(lines)
+async def save_bt_lines(lines):
+    """Replace the rotation with a new set of Qwen-generated lines."""
+    await state_store.set_bt_lines(lines)
 
-    with open(BT_LINES_FILE, "w") as f:
-        json.dump(data, f)
-
-    return line
+async def get_next_bt_line():
+    """Next line in rotation (index advanced in the same transaction)."""
+    return await state_store.next_bt_line()
 
 
 # --------------------------------------
@@ -830,7 +1145,7 @@ async def send_bt_reminder(client, event_name):
         print("[BT ERROR] Cannot find BT alert channel.")
         return
 
-    reminder_line = get_next_bt_line()
+    reminder_line = await get_next_bt_line()
 
     msg = (
         f"⚠️ **{event_name} starts in 5 minutes.**\n"
@@ -843,8 +1158,8 @@ async def send_bt_reminder(client, event_name):
 # --------------------------------------
 # DETERMINE NEXT BT EVENT
 # --------------------------------------
-def _next_bt_info():
-    state = load_bt_state()
+async def _next_bt_info():
+    state = await load_bt_state()
     last_bt = state.get("last_bt_type", "BT1")
 
     # Determine next BT type
@@ -872,7 +1187,7 @@ def _next_bt_info():
 # USER EVENT REMINDER PROCESSOR
 # --------------------------------------
 async def process_user_event_reminders(client):
-    events = load_events()
+    events = await load_events()
     if not events:
         return
 
@@ -925,7 +1240,7 @@ async def process_user_event_reminders(client):
 
                     # Mark as sent ONLY ON SUCCESS
                     evt["sent_for_date"] = event_date_str
-                    save_events(events)
+                    await state_store.mark_event_sent(evt["id"], event_date_str)
                     print("[EVENT] Triggered:", evt)
 
                 except Exception as e:
@@ -950,10 +1265,9 @@ async def bt_heartbeat_loop(client):
             await process_user_event_reminders(client)
 
             # Step 2 — BT logic
-            event_name, reminder_dt, next_bt, event_dt = _next_bt_info()
+            event_name, reminder_dt, next_bt, event_dt = await _next_bt_info()
 
             sent_key = f"{event_name}_{event_dt.date()}"
-            state = load_bt_state()
 
             print(f"[Heartbeat] BT Check | Now={now} | Reminder={reminder_dt} | Event={event_dt} | Sent={_last_sent_key}")
 
@@ -964,7 +1278,7 @@ async def bt_heartbeat_loop(client):
                 _last_sent_key = sent_key
 
                 # Immediately update BT state (fix)
-                save_bt_state(next_bt, event_dt.date())
+                await save_bt_state(next_bt, event_dt.date())
                 print("[BT STATE] Updated immediately to:", next_bt)
 
             await asyncio.sleep(20)
@@ -980,6 +1294,7 @@ import re
 from datetime import datetime, timedelta
 
 CLUSTER_WINDOW_MINUTES = 120  # adjust as needed
+DIARY_PREGEN_TTL = 24 * 3600   # a pre-built diary waits this long for the next start
 
 def read_log_cluster():
     """
@@ -1149,11 +1464,9 @@ Output ONLY the diary entry.
 
 # ---- JOURNAL EXECUTION ----
 
-async def post_diary_entry():
-    await client.wait_until_ready()
-
+async def generate_diary_entry():
     # Cluster extraction
-    cluster = read_log_cluster()
+    cluster = await bot_io.run(read_log_cluster)
 
     # Tag for Discord
     if cluster.strip():
@@ -1168,11 +1481,36 @@ async def post_diary_entry():
     # Build existential crisis diary
     prompt = build_diary_prompt_cluster(cluster)
 
-    entry = await ask_qwen(prompt, skip_system=True)
+    entry = await ask_qwen(prompt, skip_system=True, priority=BACKGROUND, caller="diary",
+                           profile="diary")
+
+    return {"tag": tag, "entry": entry}
+
+async def post_diary_entry():
+    await client.wait_until_ready()
+
+    # Pre-generated entry if one is ready, live generation otherwise
+    diary = await bot_io.run(pregen.take, "diary") or await generate_diary_entry()
 
     channel = client.get_channel(JOURNAL_CHANNEL_ID)
     if channel:
-        await channel.send(f"📓 **System Diary**\n{tag}\n\n{entry[:1900]}")
+        await channel.send(f"📓 **System Diary**\n{diary['tag']}\n\n{diary['entry'][:1900]}")
+
+# ---- PRE-GENERATION JOBS ----
+
+async def pregen_diary():
+    diary = await generate_diary_entry()
+    return diary if qwen_ok(diary["entry"]) else None
+
+async def pregen_bt_lines():
+    return await generate_bt_lines(priority=BACKGROUND) or None
+
+# The diary is posted once per start: rebuild only after one was used, once a
+# fresh activity window has passed, and keep it for the next start (a day at
+# most — older entries describe stale activity, so live generation wins).
+pregen.register("diary", pregen_diary, ttl=DIARY_PREGEN_TTL,
+                after_take=CLUSTER_WINDOW_MINUTES * 60)
+pregen.register("bt_lines", pregen_bt_lines, ttl=24 * 3600)
 
 def print_boot_banner():
     print("\n" + "=" * 45)
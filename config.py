@@ -21,3 +21,50 @@ DATA_PATH = "/data/data/com.termux/files/home/blt_bot/bot_data"
 
 # Path to system prompt file
 PROMPT_FILE = "/data/data/com.termux/files/home/blt_bot/system_prompt.txt"
+
+# llama-server instances the bot routes completions across.
+# slots = that instance's --parallel value.
+LLAMA_BACKENDS = [
+    {"name": "main", "url": "http://127.0.0.1:8080", "slots": 2},
+    # {"name": "second", "url": "http://127.0.0.1:8082", "slots": 2},
+    # {"name": "laptop", "url": "http://192.168.1.20:8080", "slots": 4},
+]
+
+# Small model (own llama-server) for short structured tasks, so the 3B
+# model's slots stay free for chat. Empty list → everything runs on "main".
+# start_services.sh only starts it when the model file exists; same check here.
+SMALL_MODEL_PATH = "/data/data/com.termux/files/home/models/Qwen2.5-0.5B-Instruct-Q4_K_M.gguf"
+LLAMA_SMALL_BACKENDS = [
+    {"name": "small", "url": "http://127.0.0.1:8081", "slots": 2},
+] if os.path.exists(SMALL_MODEL_PATH) else []
+
+# Embedding server (llama-server --embedding) for the semantic DM cache.
+# Empty list → the cache is off.
+EMBED_MODEL_PATH = "/data/data/com.termux/files/home/models/nomic-embed-text-v1.5.Q4_K_M.gguf"
+LLAMA_EMBED_BACKENDS = [
+    {"name": "embed", "url": "http://127.0.0.1:8083", "slots": 1},
+] if os.path.exists(EMBED_MODEL_PATH) else []
+
+# Semantic DM cache: cosine similarity needed to reuse an answer, how long
+# answers stay valid (seconds), and how many question→answer pairs are kept.
+DM_CACHE_THRESHOLD = 0.92
+DM_CACHE_TTL = 6 * 3600
+DM_CACHE_SIZE = 256
+
+# Load governor (modules/llm/degrade.py): DM replies get shorter when the
+# main model is busy. "Slow" generation is judged against this machine's
+# own median tokens/s (LOAD_SLOW_FRACTION of it); set LOAD_SLOW_TPS to use
+# a fixed tokens/s floor instead. The queue/wait limits are absolute.
+LOAD_ENTER_QUEUE = 2            # people waiting (DM + commands)
+LOAD_ENTER_WAIT_MS = 6000       # recent p95 queue wait
+LOAD_EXIT_WAIT_MS = 2000
+LOAD_SLOW_FRACTION = 0.5        # recent p50 t/s below half the usual → slow
+LOAD_SLOW_TPS = None            # e.g. 1.5 on the phone; None → relative
+
+# Task (ask_qwen caller) -> model pool. Unlisted tasks use "main".
+LLM_TASK_ROUTES = {
+    "bt_generate_lines": "small",
+    "diary": "small",
+    "ocr_extract": "small",
+    "memory_summary": "small",
+}
@@ -100,17 +100,21 @@ Return final answer only. No system messages.
 # ============================================================
 # LOCAL QWEN CALLER
 # ============================================================
+import os
+import sys
 import requests
 
+# Shared generation profiles (repo root on the import path)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.llm.profiles import profile_params
+
+LLAMA_URL = os.getenv("LLAMA_URL", "http://127.0.0.1:8080")
+
 def call_qwen(prompt):
     try:
         resp = requests.post(
-            "http://127.0.0.1:8080/completion",
-            json={
-                "prompt": prompt,
-                "max_tokens": 400,
-                "temperature": 0.6,
-            },
+            f"{LLAMA_URL}/completion",
+            json={"prompt": prompt, **profile_params("summary")},
             timeout=40
         )
         if resp.status_code != 200:
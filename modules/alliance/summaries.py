@@ -0,0 +1,273 @@
+# modules/alliance/summaries.py
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+from modules.ocr.postprocess import postprocess_ocr
+
+# ----------------------------------------
+# DATA FILES (relative to the bot's working dir)
+# ----------------------------------------
+DATA_DIR = "bot_data"
+BT_HISTORY_FILE = os.path.join(DATA_DIR, "bear_trap_history.txt")
+CALENDAR_FILE = os.path.join(DATA_DIR, "calendar.txt")
+EVENTS_FILE = os.path.join(DATA_DIR, "events.txt")
+KVK_HISTORY_FILE = os.path.join(DATA_DIR, "kvk_history.txt")
+VIKINGS_HISTORY_FILE = os.path.join(DATA_DIR, "vikings_history.txt")
+DOCTRINE_DIR = os.path.join(DATA_DIR, "doctrine")
+
+# Files each summary is built from. Summaries also depend on `now` (the
+# next weekly occurrence of an event), so they are not a pure function of
+# these files: every builder takes `now` explicitly, and anything cached
+# from a summary is keyed on the built text.
+SOURCES = {
+    "bt": [BT_HISTORY_FILE, os.path.join(DOCTRINE_DIR, "bt_doctrine.txt")],
+    "kvk": [KVK_HISTORY_FILE, CALENDAR_FILE, os.path.join(DOCTRINE_DIR, "kvk_doctrine.txt")],
+    "vikings": [VIKINGS_HISTORY_FILE, CALENDAR_FILE],
+    "calendar": [CALENDAR_FILE, EVENTS_FILE],
+}
+
+TOP_PLAYERS = 5
+BATCH_SECONDS = 120         # blocks saved this close together are one screenshot batch
+MIN_PLAYER_DAMAGE = 1000    # smaller "damage" is a rally count or OCR noise
+UPCOMING = 6
+HISTORY_LINES = 8
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+RALLIES_RE = re.compile(r"Rallies:\s*(\d+)")
+TOTAL_RE = re.compile(r"Total Alliance Damage[:\s]+([\d,\.]{4,})")
+RANKED_RE = re.compile(r"^\d+\)\s*(.+?)\s+—\s+([\d,]+)$")
+SAVED_RE = re.compile(r"\(Saved (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+# OCR'd screen labels ("Damage Points", "amage Points", "Total Alliance Dama", ...)
+LABEL_RE = re.compile(r"damage|dama\b|points|rall(y|ies)|total|ranking|reward", re.IGNORECASE)
+TS_RE = re.compile(r"<t:(\d+):F> \(<t:\d+:R>\)")
+
+
+# -----------------------------------------------------------
+# HELPERS
+# -----------------------------------------------------------
+
+def _read(path):
+    if not os.path.exists(path):
+        return ""
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except:
+        return ""
+
+
+def _num(raw):
+    digits = re.sub(r"[^0-9]", "", raw)
+    return int(digits) if digits else None
+
+
+def _is_player(name, dmg):
+    """False for label lines and OCR junk that the ranked-line regex also matches."""
+    letters = sum(c.isalpha() for c in name)
+    return letters >= 2 and not LABEL_RE.search(name) and dmg >= MIN_PLAYER_DAMAGE
+
+
+def _ts(dt):
+    """Discord timestamp: renders in each reader's own timezone."""
+    return f"<t:{int(dt.timestamp())}:F> (<t:{int(dt.timestamp())}:R>)"
+
+
+def plain_timestamps(text):
+    """Summary text for an LLM prompt: Discord <t:…> markup as fixed UTC times."""
+    return TS_RE.sub(
+        lambda m: datetime.fromtimestamp(int(m.group(1)), timezone.utc).strftime("%A %Y-%m-%d %H:%M UTC"),
+        text,
+    )
+
+
+# -----------------------------------------------------------
+# BEAR TRAP
+# -----------------------------------------------------------
+
+def parse_bt_block(block):
+    """One '=== OCR BT Result ===' section → {rallies, total, players, saved}."""
+    rallies = RALLIES_RE.search(block)
+    total = TOTAL_RE.search(block)
+    saved = SAVED_RE.search(block)
+
+    players = {}
+    for line in block.splitlines():
+        m = RANKED_RE.match(line.strip())
+        if m:
+            name, dmg = m.group(1).strip().strip("*"), _num(m.group(2))
+            if dmg and _is_player(name, dmg):
+                players[name] = max(dmg, players.get(name, 0))
+
+    if not players:
+        # Raw OCR dump: let the OCR post-processor find name/damage pairs
+        found, _ = postprocess_ocr([{"text": block}])
+        players = {n: d for n, d in found.items() if _is_player(n, d)}
+
+    return {
+        "rallies": int(rallies.group(1)) if rallies else None,
+        "total": _num(total.group(1)) if total else None,
+        "players": sorted(players.items(), key=lambda x: x[1], reverse=True),
+        "saved": saved.group(1) if saved else None,
+    }
+
+
+def bt_results():
+    text = _read(BT_HISTORY_FILE)
+    blocks = [b for b in text.split("=== OCR BT Result ===") if b.strip()]
+    return [parse_bt_block(b) for b in blocks]
+
+
+def _saved_at(result):
+    try:
+        return datetime.strptime(result["saved"], "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def latest_batch(results):
+    """
+    The newest screenshot batch merged into one result. One upload is
+    saved as several consecutive blocks (totals screen, then ranking
+    pages); only blocks saved within BATCH_SECONDS of each other are
+    merged, so totals and players always come from the same event.
+    """
+    batch = [results[-1]]
+    for r in reversed(results[:-1]):
+        newer, older = _saved_at(batch[0]), _saved_at(r)
+        if newer is None or older is None or (newer - older).total_seconds() > BATCH_SECONDS:
+            break
+        batch.insert(0, r)
+
+    players = {}
+    for r in batch:
+        for name, dmg in r["players"]:
+            players[name] = max(dmg, players.get(name, 0))
+    return {
+        "rallies": next((r["rallies"] for r in batch if r["rallies"]), None),
+        "total": next((r["total"] for r in batch if r["total"]), None),
+        "players": sorted(players.items(), key=lambda x: x[1], reverse=True),
+        "saved": batch[0]["saved"],
+    }
+
+
+def bt_summary(now=None):
+    results = [r for r in bt_results() if r["total"] or r["players"]]
+    if not results:
+        return "🐻 **Bear Trap**\nNo Bear Trap results recorded yet."
+
+    latest = latest_batch(results)
+
+    lines = ["🐻 **Bear Trap — latest result**"]
+    if latest["saved"]:
+        lines.append(f"_Recorded {latest['saved'][:16]}_")
+    if latest["total"]:
+        lines.append(f"🏹 **Alliance Damage:** {latest['total']:,}")
+    if latest["rallies"]:
+        lines.append(f"⚔️ **Rallies:** {latest['rallies']}")
+
+    if latest["players"]:
+        lines.append("\n**Top players:**")
+        for i, (name, dmg) in enumerate(latest["players"][:TOP_PLAYERS], start=1):
+            lines.append(f"{i}. **{name}** — {dmg:,}")
+
+    nxt = next((e for e in calendar_entries(now) if "bear trap" in e[1].lower()), None)
+    if nxt:
+        lines.append(f"\n⏰ Next Bear Trap: {_ts(nxt[0])}")
+
+    return "\n".join(lines)
+
+
+# -----------------------------------------------------------
+# CALENDAR
+# -----------------------------------------------------------
+
+def _next_weekly(weekday, hhmm, now):
+    hh, mm = (int(x) for x in hhmm.split(":"))
+    days = (WEEKDAYS.index(weekday) - now.weekday()) % 7
+    due = (now + timedelta(days=days)).replace(hour=hh, minute=mm, second=0, microsecond=0)
+    if due <= now:
+        due += timedelta(days=7)
+    return due
+
+
+def calendar_entries(now=None):
+    """Upcoming (datetime UTC, name) from calendar.txt ('Name | Weekday HH:MM') and events.txt."""
+    now = now or datetime.now(timezone.utc)
+    out = []
+
+    for line in _read(CALENDAR_FILE).splitlines():
+        if "|" not in line:
+            continue
+        name, when = (x.strip() for x in line.split("|", 1))
+        parts = when.split()
+        if len(parts) != 2 or parts[0].lower() not in WEEKDAYS:
+            continue
+        try:
+            out.append((_next_weekly(parts[0].lower(), parts[1], now), name))
+        except ValueError:
+            continue
+
+    for line in _read(EVENTS_FILE).splitlines():
+        try:
+            dt = datetime.strptime(line.strip(), "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        if dt > now:
+            out.append((dt, "Scheduled event"))
+
+    return sorted(out)
+
+
+def calendar_summary(now=None):
+    entries = calendar_entries(now)
+    if not entries:
+        return "📅 **BLT Calendar**\nNo upcoming events in the calendar."
+
+    lines = ["📅 **BLT Calendar — upcoming**"]
+    for dt, name in entries[:UPCOMING]:
+        lines.append(f"- **{name}** — {_ts(dt)}")
+    return "\n".join(lines)
+
+
+# -----------------------------------------------------------
+# KVK / VIKINGS
+# -----------------------------------------------------------
+
+def _history_summary(title, history_file, event_name, now=None):
+    lines = [title]
+
+    nxt = next((e for e in calendar_entries(now) if event_name.lower() in e[1].lower()), None)
+    if nxt:
+        lines.append(f"⏰ Next {nxt[1]}: {_ts(nxt[0])}")
+
+    history = [l.strip() for l in _read(history_file).splitlines() if l.strip()]
+    if history:
+        lines.append("\n**Latest notes:**")
+        lines.extend(f"- {l}" for l in history[-HISTORY_LINES:])
+    else:
+        lines.append(f"No {event_name} history recorded yet.")
+
+    return "\n".join(lines)
+
+
+def kvk_summary(now=None):
+    return _history_summary("🏰 **KvK update**", KVK_HISTORY_FILE, "KvK", now)
+
+
+def vikings_summary(now=None):
+    return _history_summary("🛡️ **Vikings summary**", VIKINGS_HISTORY_FILE, "Vikings", now)
+
+
+SUMMARIES = {
+    "bt": bt_summary,
+    "kvk": kvk_summary,
+    "vikings": vikings_summary,
+    "calendar": calendar_summary,
+}
+
+
+def build_summary(mode, now=None):
+    """Summary text for `mode` as of `now` (aware UTC; default: the current time)."""
+    return SUMMARIES[mode](now or datetime.now(timezone.utc))
@@ -0,0 +1,386 @@
+# modules/chat/memlog.py
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+
+from modules.llm.tokens import estimate_tokens
+
+# ----------------------------------------
+# CHAT MEMORY LOG SETTINGS
+# ----------------------------------------
+SEGMENT_BYTES = 64 * 1024       # active segment is sealed past this size
+RECENT_TURNS = 64               # offsets kept in the index for direct seeks
+MEMORY_CHARS = 2000             # rendered memory handed to the prompt (tail kept)
+COMPACT_MIN_SEGMENTS = 4        # sealed, unindexed segments before they are merged
+COMPACT_INTERVAL = 15 * 60
+
+ROLE_LABELS = {"user": "User", "bot": "Bot"}
+
+
+class ChatLog:
+    """
+    Per-user chat memory as append-only JSONL segments:
+
+        chat_memory/<uid>/seg-000001.jsonl   {"ts", "role", "text", "tokens"} per line
+        chat_memory/<uid>/index.json         segments, turns per segment + (segment, offset) of recent turns
+
+    Appending writes one line and the small index; reading the last N turns
+    seeks straight to their offsets, so per-turn cost does not grow with the
+    history. Sealed segments outside the recent window are merged into
+    gzip archives in the background; nothing is ever truncated. Segments
+    merged while someone is still reading them are deleted once the last
+    reader is done.
+    """
+
+    def __init__(self, root, segment_bytes=SEGMENT_BYTES, recent_turns=RECENT_TURNS):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.recent_turns = recent_turns
+        self._lock = threading.Lock()
+        self._readers = {}      # uid -> history()/recent() calls in progress
+        self._doomed = {}       # uid -> compacted segment names awaiting deletion
+        os.makedirs(root, exist_ok=True)
+
+    # -------------------------
+    # Index
+    # -------------------------
+    def _dir(self, uid):
+        return os.path.join(self.root, str(uid))
+
+    def _index_path(self, uid):
+        return os.path.join(self._dir(uid), "index.json")
+
+    def _load_index(self, uid):
+        p = self._index_path(uid)
+        if os.path.exists(p):
+            try:
+                return json.load(open(p, "r", encoding="utf-8"))
+            except:
+                print(f"[MEMLOG] Rebuilding unreadable index for {uid}")
+                return self._rebuild_index(uid)
+        os.makedirs(self._dir(uid), exist_ok=True)
+        if any(n.startswith(("seg-", "archive-")) for n in os.listdir(self._dir(uid))):
+            return self._rebuild_index(uid)
+        index = {"next_seg": 1, "segments": [], "recent": [], "turns": 0, "counts": {}}
+        self._migrate_txt(uid, index)
+        return index
+
+    def _save_index(self, uid, index):
+        p = self._index_path(uid)
+        tmp = p + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, p)
+
+    def _rebuild_index(self, uid):
+        """Recover the index from the segment files themselves."""
+        doomed = self._doomed.get(str(uid), [])
+        names = sorted(n for n in os.listdir(self._dir(uid))
+                       if n.startswith(("seg-", "archive-")) and n not in doomed)
+        # Archives only ever hold turns older than every remaining segment,
+        # so name order (archive-* before seg-*) is history order.
+        last = max(int(n.split("-")[1].split(".")[0]) for n in names) if names else 0
+        index = {"next_seg": last + 1, "segments": names, "recent": [], "turns": 0, "counts": {}}
+        for name in names:
+            if name.startswith("archive-"):
+                index["counts"][name] = sum(1 for _ in self._iter_file(uid, name))
+                index["turns"] += index["counts"][name]
+                continue
+            index["counts"][name] = 0
+            with open(os.path.join(self._dir(uid), name), "rb") as f:
+                offset = f.tell()
+                for line in iter(f.readline, b""):
+                    index["recent"].append([name, offset])
+                    index["turns"] += 1
+                    index["counts"][name] += 1
+                    offset = f.tell()
+        index["recent"] = index["recent"][-self.recent_turns:]
+        return index
+
+    def _active_segment(self, uid, index):
+        if index["segments"] and index["segments"][-1].startswith("seg-"):
+            name = index["segments"][-1]
+            p = os.path.join(self._dir(uid), name)
+            if not os.path.exists(p) or os.path.getsize(p) < self.segment_bytes:
+                return name
+        name = f"seg-{index['next_seg']:06d}.jsonl"
+        index["next_seg"] += 1
+        index["segments"].append(name)
+        index.setdefault("counts", {})[name] = 0
+        return name
+
+    def _count(self, index, name, n):
+        # Segments from older indexes have no count yet: _segment_counts() fills them in
+        counts = index.setdefault("counts", {})
+        if name in counts:
+            counts[name] += n
+
+    def _segment_counts(self, uid, index):
+        """Turns per segment (call with the lock held); counts missing ones once."""
+        counts = index.setdefault("counts", {})
+        missing = [n for n in index["segments"] if n not in counts]
+        for name in missing:
+            counts[name] = sum(1 for _ in self._iter_file(uid, name))
+        if missing:
+            self._save_index(uid, index)
+        return dict(counts)
+
+    # -------------------------
+    # Readers vs. compaction
+    # -------------------------
+    def _enter_read(self, uid):
+        """Call with the lock held."""
+        uid = str(uid)
+        self._readers[uid] = self._readers.get(uid, 0) + 1
+
+    def _exit_read(self, uid):
+        uid = str(uid)
+        with self._lock:
+            self._readers[uid] -= 1
+            if self._readers[uid]:
+                return
+            del self._readers[uid]
+            doomed = self._doomed.pop(uid, [])
+        self._remove(uid, doomed)
+
+    def _remove(self, uid, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self._dir(uid), name))
+            except FileNotFoundError:
+                pass
+
+    # -------------------------
+    # Write
+    # -------------------------
+    def append(self, uid, turns):
+        """Append [(role, text), ...] as one write + one index update."""
+        with self._lock:
+            index = self._load_index(uid)
+            name = self._active_segment(uid, index)
+            path = os.path.join(self._dir(uid), name)
+            now = time.time()
+
+            with open(path, "ab") as f:
+                for role, text in turns:
+                    rec = {"ts": now, "role": role, "text": text, "tokens": estimate_tokens(text)}
+                    index["recent"].append([name, f.tell()])
+                    f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+                    index["turns"] += 1
+                f.flush()
+                os.fsync(f.fileno())
+            self._count(index, name, len(turns))
+
+            index["recent"] = index["recent"][-self.recent_turns:]
+            self._save_index(uid, index)
+
+    # -------------------------
+    # Read
+    # -------------------------
+    def recent(self, uid, n=RECENT_TURNS):
+        """Last `n` turns (n <= RECENT_TURNS), read by seeking to indexed offsets."""
+        if not os.path.isdir(self._dir(uid)) and not os.path.exists(self._legacy_path(uid)):
+            return []
+        with self._lock:
+            index = self._load_index(uid)
+            if not os.path.exists(self._index_path(uid)):
+                self._save_index(uid, index)
+            wanted = index["recent"][-n:]
+            self._enter_read(uid)
+
+        out = []
+        handles = {}
+        try:
+            for name, offset in wanted:
+                f = handles.get(name)
+                if f is None:
+                    try:
+                        f = handles[name] = open(os.path.join(self._dir(uid), name), "rb")
+                    except FileNotFoundError:
+                        continue
+                f.seek(offset)
+                try:
+                    out.append(json.loads(f.readline()))
+                except ValueError:
+                    continue
+        finally:
+            for f in handles.values():
+                f.close()
+            self._exit_read(uid)
+        return out
+
+    def _iter_file(self, uid, name):
+        p = os.path.join(self._dir(uid), name)
+        opener = gzip.open if name.endswith(".gz") else open
+        try:
+            f = opener(p, "rb")
+        except FileNotFoundError:
+            print(f"[MEMLOG] Skipping missing {p}")
+            return
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def history(self, uid):
+        """Every stored turn, oldest first (archives included)."""
+        if not os.path.isdir(self._dir(uid)) and not os.path.exists(self._legacy_path(uid)):
+            return
+        with self._lock:
+            index = self._load_index(uid)
+            if not os.path.exists(self._index_path(uid)):
+                self._save_index(uid, index)
+            segments = list(index["segments"])
+            self._enter_read(uid)
+        # Registered as a reader: compact() keeps these files until we finish
+        try:
+            for name in segments:
+                yield from self._iter_file(uid, name)
+        finally:
+            self._exit_read(uid)
+
+    def turns(self, uid, start, n):
+        """
+        Turns [start, start + n) in history order. Whole segments before
+        `start` are skipped by their indexed turn counts, so the cost does
+        not grow with the length of the history.
+        """
+        if n <= 0 or not os.path.isdir(self._dir(uid)):
+            return []
+        with self._lock:
+            index = self._load_index(uid)
+            counts = self._segment_counts(uid, index)
+            segments = list(index["segments"])
+            self._enter_read(uid)
+
+        out = []
+        pos = 0
+        try:
+            for name in segments:
+                if pos >= start + n:
+                    break
+                if pos + counts.get(name, 0) <= start:
+                    pos += counts.get(name, 0)
+                    continue
+                for turn in self._iter_file(uid, name):
+                    if start <= pos < start + n:
+                        out.append(turn)
+                    pos += 1
+        finally:
+            self._exit_read(uid)
+        return out
+
+    def turn_count(self, uid):
+        """Turns stored for `uid` (from the index, no segment reads)."""
+        if not os.path.isdir(self._dir(uid)):
+            return 0
+        with self._lock:
+            return self._load_index(uid)["turns"]
+
+    def users(self):
+        return [d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d))]
+
+    @staticmethod
+    def render(turns, max_chars=MEMORY_CHARS):
+        """Turns as the "User: …\\nBot: …" text the prompts expect, tail kept."""
+        text = "".join(f"{ROLE_LABELS.get(t['role'], t['role'])}: {t['text']}\n" for t in turns)
+        return text[-max_chars:]
+
+    # -------------------------
+    # Compaction
+    # -------------------------
+    def compact(self, uid):
+        """Merge sealed segments outside the recent window into one gzip archive."""
+        with self._lock:
+            index = self._load_index(uid)
+            referenced = {name for name, _ in index["recent"]}
+            active = index["segments"][-1] if index["segments"] else None
+            sealed = [n for n in index["segments"]
+                      if n.startswith("seg-") and n != active and n not in referenced]
+            if len(sealed) < COMPACT_MIN_SEGMENTS:
+                return 0
+            archive = f"archive-{index['next_seg']:06d}.jsonl.gz"
+            index["next_seg"] += 1
+
+        # Sealed segments never change, so the copy runs without the lock
+        tmp = os.path.join(self._dir(uid), archive + ".tmp")
+        with gzip.open(tmp, "wb") as out:
+            for name in sealed:
+                with open(os.path.join(self._dir(uid), name), "rb") as f:
+                    out.write(f.read())
+        os.replace(tmp, os.path.join(self._dir(uid), archive))
+
+        with self._lock:
+            index = self._load_index(uid)
+            pos = index["segments"].index(sealed[0])
+            index["segments"] = [n for n in index["segments"] if n not in sealed]
+            index["segments"].insert(pos, archive)
+            counts = index.setdefault("counts", {})
+            if all(n in counts for n in sealed):
+                counts[archive] = sum(counts[n] for n in sealed)
+            for n in sealed:
+                counts.pop(n, None)
+            self._save_index(uid, index)
+            if self._readers.get(str(uid)):
+                self._doomed.setdefault(str(uid), []).extend(sealed)
+                sealed_now = []
+            else:
+                sealed_now = sealed
+        self._remove(uid, sealed_now)
+
+        print(f"[MEMLOG] Compacted {len(sealed)} segments for {uid} → {archive}")
+        return len(sealed)
+
+    def compact_all(self):
+        return sum(self.compact(uid) for uid in self.users())
+
+    async def loop(self, interval=COMPACT_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.compact_all)
+            except Exception as e:
+                print("[MEMLOG ERROR]:", e)
+
+    # -------------------------
+    # Old chat_memory/<uid>.txt
+    # -------------------------
+    def _legacy_path(self, uid):
+        return os.path.join(self.root, f"{uid}.txt")
+
+    def _migrate_txt(self, uid, index):
+        """Import a pre-segment memory file as turns (kept as <uid>.txt.migrated)."""
+        p = self._legacy_path(uid)
+        if not os.path.exists(p):
+            return
+        ts = os.path.getmtime(p)
+        turns = []
+        for line in open(p, "r", encoding="utf-8").read().splitlines():
+            for role, label in ROLE_LABELS.items():
+                if line.startswith(label + ": "):
+                    turns.append([role, line[len(label) + 2:]])
+                    break
+            else:
+                if turns:
+                    turns[-1][1] += "\n" + line
+                elif line.strip():
+                    # Text chopped by the old 2000-char cap before the first label
+                    turns.append(["bot", line])
+
+        if turns:
+            name = self._active_segment(uid, index)
+            with open(os.path.join(self._dir(uid), name), "ab") as f:
+                for role, text in turns:
+                    rec = {"ts": ts, "role": role, "text": text, "tokens": estimate_tokens(text)}
+                    index["recent"].append([name, f.tell()])
+                    f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+                    index["turns"] += 1
+            self._count(index, name, len(turns))
+            index["recent"] = index["recent"][-self.recent_turns:]
+        os.replace(p, p + ".migrated")
+        print(f"[MEMLOG] Migrated {len(turns)} turns from {p}")
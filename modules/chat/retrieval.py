@@ -0,0 +1,247 @@
+# modules/chat/retrieval.py
+import math
+import re
+from collections import Counter, OrderedDict
+
+from modules.llm.semantic import embed_texts
+from modules.llm.tokens import estimate_tokens
+
+try:
+    import numpy as np
+except ImportError:     # BM25 only without NumPy
+    np = None
+
+# ----------------------------------------
+# MEMORY RETRIEVAL SETTINGS
+# ----------------------------------------
+BM25_K1 = 1.5
+BM25_B = 0.75
+TOP_K = 6                   # relevant exchanges handed to the prompt
+RECENT_PAIRS = 1            # latest exchanges always included (conversation flow)
+MEMORY_TOKEN_BUDGET = 600   # estimated tokens of recalled memory
+TOPIC_BOOST = 0.25          # per whitelist topic the memory mentions
+QUERY_TOPIC_BOOST = 0.5     # ... extra when the message mentions it too
+RERANK_CANDIDATES = 8       # BM25 hits re-scored by embedding similarity
+RERANK_WEIGHT = 0.5         # share of the final score from cosine similarity
+RERANK_CHARS = 1000         # memory text sent to /embedding
+MAX_INDEXES = 32            # users whose index stays in memory
+
+_WORD = re.compile(r"\w+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "do", "for", "from",
+    "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "so", "that",
+    "the", "this", "to", "was", "we", "what", "when", "where", "which", "who",
+    "why", "will", "with", "you", "your",
+}
+
+
+def terms(text):
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class MemoryIndex:
+    """
+    BM25 index over one user's stored exchanges (a user turn plus the bot's
+    reply is one document). Built once from the turn log, then extended in
+    place as new turns are saved.
+    """
+
+    def __init__(self, topics=()):
+        self.topics = [(t, re.compile(r"\b" + re.escape(t) + r"\b", re.IGNORECASE)) for t in topics]
+        self.docs = []              # {"text", "tokens", "tf", "len", "topics", "vec"}
+        self.postings = {}          # term -> [doc id]
+        self.total_len = 0
+        self._open = None           # doc id still waiting for the bot's reply
+
+    def topics_in(self, text):
+        return {t for t, rx in self.topics if rx.search(text)}
+
+    # -------------------------
+    # Build
+    # -------------------------
+    def add_turn(self, role, text, tokens):
+        line = f"{'User' if role == 'user' else 'Bot'}: {text}\n"
+        if role != "user" and self._open is not None:
+            doc_id = self._open
+            self._open = None
+            self._extend(doc_id, line, tokens)
+            return
+        self.docs.append({"text": "", "tokens": 0, "tf": Counter(), "len": 0,
+                          "topics": set(), "vec": None})
+        doc_id = len(self.docs) - 1
+        self._open = doc_id if role == "user" else None
+        self._extend(doc_id, line, tokens)
+
+    def _extend(self, doc_id, line, tokens):
+        doc = self.docs[doc_id]
+        words = terms(line)
+        for w in set(words):
+            if w not in doc["tf"]:
+                self.postings.setdefault(w, []).append(doc_id)
+        doc["tf"].update(words)
+        doc["len"] += len(words)
+        doc["text"] += line
+        doc["tokens"] += tokens
+        doc["topics"] |= self.topics_in(line)
+        doc["vec"] = None
+        self.total_len += len(words)
+
+    # -------------------------
+    # Query
+    # -------------------------
+    def bm25(self, query_terms, exclude=()):
+        """{doc id: score} for documents sharing at least one term with the query."""
+        n = len(self.docs)
+        avg_len = self.total_len / n if n else 0
+        scores = {}
+        for w in set(query_terms):
+            posting = self.postings.get(w)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id in posting:
+                if doc_id in exclude:
+                    continue
+                doc = self.docs[doc_id]
+                tf = doc["tf"][w]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc["len"] / (avg_len or 1))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def score(self, query, exclude=()):
+        """BM25 scores with the whitelist topic boost applied."""
+        query_topics = self.topics_in(query)
+        scores = self.bm25(terms(query), exclude)
+        for doc_id, s in scores.items():
+            doc_topics = self.docs[doc_id]["topics"]
+            scores[doc_id] = s * (1 + TOPIC_BOOST * len(doc_topics)
+                                  + QUERY_TOPIC_BOOST * len(doc_topics & query_topics))
+        return scores
+
+
+class MemoryRetriever:
+    """
+    Picks the stored exchanges worth putting in a DM prompt: the latest
+    exchange plus the top-k BM25 matches for the message, optionally
+    re-ranked by embedding similarity, within a token budget.
+    """
+
+    def __init__(self, chat_log, io, topics=()):
+        self.chat_log = chat_log
+        self.io = io
+        self.topics = list(topics)
+        self.indexes = OrderedDict()    # uid -> MemoryIndex (LRU)
+        self.generation = {}            # uid -> saves seen, to detect saves during a build
+
+        self.recalls = 0
+        self.reranked = 0
+        self.builds = 0
+        self.selected = 0
+
+    # -------------------------
+    # Index lifecycle
+    # -------------------------
+    def _build(self, uid):
+        index = MemoryIndex(self.topics)
+        for turn in self.chat_log.history(uid):
+            index.add_turn(turn["role"], turn["text"], turn.get("tokens", 0))
+        return index
+
+    async def index_for(self, uid):
+        uid = str(uid)
+        index = self.indexes.get(uid)
+        if index is not None:
+            self.indexes.move_to_end(uid)
+            return index
+
+        gen = self.generation.get(uid, 0)
+        index = await self.io.run(self._build, uid)
+        self.builds += 1
+        # A save landed mid-build: use this copy once, rebuild next time
+        if self.generation.get(uid, 0) == gen:
+            self.indexes[uid] = index
+            while len(self.indexes) > MAX_INDEXES:
+                self.indexes.popitem(last=False)
+        return index
+
+    def note(self, uid, turns):
+        """Extend a loaded index with freshly saved [(role, text)] turns."""
+        uid = str(uid)
+        self.generation[uid] = self.generation.get(uid, 0) + 1
+        index = self.indexes.get(uid)
+        if index is not None:
+            for role, text in turns:
+                index.add_turn(role, text, estimate_tokens(text))
+
+    def clear(self):
+        n = len(self.indexes)
+        self.indexes.clear()
+        return n
+
+    # -------------------------
+    # Recall
+    # -------------------------
+    async def _rerank(self, index, ranked, scores, qvec):
+        """Blend normalised BM25 with cosine similarity for the top candidates."""
+        top = ranked[:RERANK_CANDIDATES]
+        missing = [d for d in top if index.docs[d]["vec"] is None]
+        try:
+            # One /embedding request for every candidate not embedded yet
+            vecs = await embed_texts([index.docs[d]["text"][:RERANK_CHARS] for d in missing])
+        except Exception as e:
+            print("[RECALL] rerank skipped:", e)
+            return ranked
+        for doc_id, vec in zip(missing, vecs):
+            index.docs[doc_id]["vec"] = vec
+        if any(index.docs[d]["vec"] is None or index.docs[d]["vec"].shape != qvec.shape for d in top):
+            return ranked
+
+        best = max(scores[d] for d in top) or 1.0
+        blended = {
+            d: (1 - RERANK_WEIGHT) * scores[d] / best
+               + RERANK_WEIGHT * max(float(index.docs[d]["vec"] @ qvec), 0.0)
+            for d in top
+        }
+        self.reranked += 1
+        return sorted(top, key=blended.get, reverse=True) + ranked[RERANK_CANDIDATES:]
+
+    async def recall(self, uid, query, qvec=None, top_k=TOP_K, budget=MEMORY_TOKEN_BUDGET):
+        """Memory text for the prompt ("User: …\\nBot: …"), oldest first."""
+        self.recalls += 1
+        index = await self.index_for(uid)
+        if not index.docs:
+            return ""
+
+        recent = list(range(max(len(index.docs) - RECENT_PAIRS, 0), len(index.docs)))
+        scores = index.score(query, exclude=set(recent))
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        if qvec is not None and np is not None and len(ranked) > 1:
+            ranked = await self._rerank(index, ranked, scores, qvec)
+
+        chosen = []
+        used = 0
+        for doc_id in reversed(recent):
+            doc = index.docs[doc_id]
+            if used + doc["tokens"] > budget and chosen:
+                break
+            chosen.append(doc_id)
+            used += doc["tokens"]
+        for doc_id in ranked[:top_k]:
+            tokens = index.docs[doc_id]["tokens"]
+            if used + tokens > budget:
+                continue
+            chosen.append(doc_id)
+            used += tokens
+
+        self.selected += len(chosen)
+        return "".join(index.docs[d]["text"] for d in sorted(chosen))
+
+    def stats(self):
+        return {
+            "indexes": len(self.indexes),
+            "docs": sum(len(i.docs) for i in self.indexes.values()),
+            "recalls": self.recalls,
+            "builds": self.builds,
+            "reranked": self.reranked,
+            "avg_selected": round(self.selected / self.recalls, 1) if self.recalls else 0.0,
+        }
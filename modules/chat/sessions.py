@@ -0,0 +1,115 @@
+# modules/chat/sessions.py
+import asyncio
+import time
+
+# ----------------------------------------
+# DM SESSION SETTINGS
+# ----------------------------------------
+SESSION_TTL = 7 * 24 * 3600     # idle this long → session ends, /chat again to reopen
+FLUSH_INTERVAL = 2              # seconds between write-behind checks
+EXPIRE_INTERVAL = 60            # seconds between idle-session sweeps
+
+MODES = ("chat", "deepchat")
+
+
+class SessionManager:
+    """
+    Active DM sessions kept in memory: uid -> {"mode", "last_active", "count"}.
+    Rows are read from the state store once at startup; changes only mark
+    the uid dirty and a background loop writes them behind as row upserts.
+    """
+
+    def __init__(self, store, ttl=SESSION_TTL):
+        self.store = store
+        self.ttl = ttl
+        self.sessions = {}
+        self.changed = set()        # uids to upsert on the next flush
+        self.removed = set()        # uids to delete on the next flush
+        self.writes = 0
+        self.load()
+
+    # -------------------------
+    # Persistence
+    # -------------------------
+    def load(self):
+        self.sessions = self.store.load_sessions_sync()
+        self.expire()
+
+    def _pending(self):
+        changed = {uid: dict(self.sessions[uid]) for uid in self.changed if uid in self.sessions}
+        removed = set(self.removed)
+        self.changed.clear()
+        self.removed.clear()
+        return changed, removed
+
+    async def flush(self):
+        if not self.changed and not self.removed:
+            return
+        changed, removed = self._pending()
+        try:
+            await self.store.save_sessions(changed, removed)
+            self.writes += 1
+        except Exception as e:
+            # Keep them pending for the next attempt
+            self.changed.update(changed)
+            self.removed.update(removed)
+            print("[SESSIONS] write failed:", e)
+
+    def flush_sync(self):
+        """Final write on shutdown (event loop may already be closing)."""
+        if self.changed or self.removed:
+            self.store.save_sessions_sync(*self._pending())
+
+    async def loop(self, interval=FLUSH_INTERVAL):
+        last_sweep = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - last_sweep >= EXPIRE_INTERVAL:
+                self.expire()
+                last_sweep = time.monotonic()
+            await self.flush()
+
+    # -------------------------
+    # Sessions
+    # -------------------------
+    def _mark(self, uid):
+        self.changed.add(uid)
+        self.removed.discard(uid)
+
+    def activate(self, uid, mode="chat"):
+        self.sessions[str(uid)] = {"mode": mode, "last_active": time.time(), "count": 0}
+        self._mark(str(uid))
+
+    def end(self, uid):
+        if self.sessions.pop(str(uid), None) is not None:
+            self.changed.discard(str(uid))
+            self.removed.add(str(uid))
+
+    def get(self, uid):
+        """Active session dict or None (memory only, no disk I/O)."""
+        s = self.sessions.get(str(uid))
+        if s is None:
+            return None
+        if time.time() - s["last_active"] > self.ttl:
+            self.end(uid)
+            return None
+        return s
+
+    def touch(self, uid):
+        s = self.sessions.get(str(uid))
+        if s is not None:
+            s["last_active"] = time.time()
+            s["count"] += 1
+            self._mark(str(uid))
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        for uid in [u for u, s in self.sessions.items() if s["last_active"] < cutoff]:
+            self.end(uid)
+            print(f"[SESSIONS] {uid} expired after idle TTL")
+
+    def stats(self):
+        modes = {m: 0 for m in MODES}
+        for s in self.sessions.values():
+            modes[s["mode"]] = modes.get(s["mode"], 0) + 1
+        return {"active": len(self.sessions), "modes": modes, "writes": self.writes}
@@ -0,0 +1,183 @@
+# modules/chat/summarize.py
+import asyncio
+import json
+import os
+import time
+
+from modules.chat.memlog import ROLE_LABELS
+from modules.llm.tokens import estimate_tokens
+
+# ----------------------------------------
+# ROLLING MEMORY SUMMARY SETTINGS
+# ----------------------------------------
+SUMMARIZE_AFTER = 48        # unsummarised turns before a user is compacted
+KEEP_RECENT = 24            # newest turns never summarised (recall covers them verbatim)
+CHUNK_TURNS = 24            # oldest unsummarised turns folded in per generation
+CHUNK_CHARS = 4000          # cap on the transcript sent with one chunk
+SUMMARY_CHARS = 1200        # stored summary is cut to this
+SUMMARIZE_INTERVAL = 120    # seconds between passes (each pass waits for an idle backend)
+
+SUMMARY_FILE = "summary.json"
+
+SUMMARY_PROMPT = (
+    "You keep a short running summary of a Discord user's past conversations with a bot.\n"
+    "Merge the new exchanges into the existing summary. Keep durable facts: the user's "
+    "preferences, plans, alliance roles, recurring topics and anything they asked to be "
+    "remembered. Drop small talk. Write plain sentences, at most 120 words.\n\n"
+    "Existing summary:\n{summary}\n\n"
+    "New exchanges:\n{transcript}\n\n"
+    "Updated summary:"
+)
+
+
+class MemorySummarizer:
+    """
+    Rolling per-user summary of the oldest chat turns, kept next to the turn
+    log as chat_memory/<uid>/summary.json:
+
+        {"text", "through", "updated", "sources": [{"turns", "from_ts", "to_ts", "at"}]}
+
+    `through` is how many turns (oldest first) the text covers; each source
+    records which turns one generation folded in. Once a user has more than
+    SUMMARIZE_AFTER unsummarised turns, the next CHUNK_TURNS are merged into
+    the existing text with one short background generation — the summary is
+    updated, never rebuilt from the whole history.
+    """
+
+    def __init__(self, chat_log, io, generate, is_idle):
+        self.chat_log = chat_log
+        self.io = io
+        self.generate = generate        # async prompt -> text or None
+        self.is_idle = is_idle          # async () -> bool
+        self.summaries = {}             # uid -> summary dict (loaded lazily)
+
+        self.runs = 0
+        self.turns_folded = 0
+        self.failed = 0
+        self.skipped_busy = 0
+
+    # -------------------------
+    # Storage
+    # -------------------------
+    def _path(self, uid):
+        return os.path.join(self.chat_log.root, str(uid), SUMMARY_FILE)
+
+    def _read(self, uid):
+        p = self._path(uid)
+        if os.path.exists(p):
+            try:
+                return json.load(open(p, "r", encoding="utf-8"))
+            except:
+                print(f"[SUMMARY] Ignoring unreadable {p}")
+        return {"text": "", "through": 0, "updated": None, "sources": []}
+
+    def _write(self, uid, summary):
+        p = self._path(uid)
+        tmp = p + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(tmp, p)
+
+    async def get(self, uid):
+        uid = str(uid)
+        if uid not in self.summaries:
+            self.summaries[uid] = await self.io.run(self._read, uid)
+        return self.summaries[uid]
+
+    async def text_for(self, uid):
+        return (await self.get(uid))["text"]
+
+    # -------------------------
+    # Compaction
+    # -------------------------
+    def _chunk(self, uid, start, n):
+        """
+        Up to `n` turns from `start`, ending before a user turn so a chunk
+        never splits an exchange. Decided by role, not parity: migrated
+        logs can start with a bot turn.
+        """
+        turns = self.chat_log.turns(uid, start, n + 1)    # one extra to see what follows
+        cut = min(n, len(turns))
+        while 0 < cut < len(turns) and turns[cut]["role"] != "user":
+            cut -= 1
+        return turns[:cut or min(n, len(turns))]
+
+    async def pending(self, uid):
+        """Turns ready to fold in now (0 below the threshold)."""
+        summary = await self.get(uid)
+        total = await self.io.run(self.chat_log.turn_count, uid)
+        backlog = total - summary["through"]
+        if backlog <= SUMMARIZE_AFTER:
+            return 0
+        # Upper bound: _chunk() trims it back to whole exchanges
+        return min(CHUNK_TURNS, backlog - KEEP_RECENT)
+
+    async def compact(self, uid):
+        """Fold the next chunk of old turns into the summary; True if it did."""
+        uid = str(uid)
+        n = await self.pending(uid)
+        if n <= 0:
+            return False
+
+        summary = await self.get(uid)
+        start = summary["through"]
+        turns = await self.io.run(self._chunk, uid, start, n)
+        if not turns:
+            return False
+
+        transcript = "".join(f"{ROLE_LABELS.get(t['role'], t['role'])}: {t['text']}\n" for t in turns)
+        prompt = SUMMARY_PROMPT.format(
+            summary=summary["text"] or "(none yet)",
+            transcript=transcript[-CHUNK_CHARS:],
+        )
+        text = await self.generate(prompt)
+        if not text:
+            self.failed += 1
+            return False
+
+        updated = {
+            "text": text.strip()[:SUMMARY_CHARS],
+            "through": start + len(turns),
+            "updated": time.time(),
+            "sources": summary["sources"] + [{
+                "turns": [start, start + len(turns)],
+                "from_ts": turns[0].get("ts"),
+                "to_ts": turns[-1].get("ts"),
+                "at": time.time(),
+            }],
+        }
+        await self.io.run(self._write, uid, updated)
+        self.summaries[uid] = updated
+
+        self.runs += 1
+        self.turns_folded += len(turns)
+        print(f"[SUMMARY] {uid}: folded turns {start}-{updated['through']} "
+              f"({estimate_tokens(updated['text'])} tokens)")
+        return True
+
+    async def run_once(self):
+        for uid in await self.io.run(self.chat_log.users):
+            if await self.pending(uid) <= 0:
+                continue
+            # One generation at a time, and only while nobody is waiting on the model
+            if not await self.is_idle():
+                self.skipped_busy += 1
+                return
+            await self.compact(uid)
+
+    async def loop(self, interval=SUMMARIZE_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print("[SUMMARY ERROR]:", e)
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "turns_folded": self.turns_folded,
+            "failed": self.failed,
+            "skipped_busy": self.skipped_busy,
+            "loaded": len(self.summaries),
+        }
@@ -0,0 +1,73 @@
+# modules/llm/cache.py
+import hashlib
+import os
+from collections import OrderedDict
+from time import monotonic
+
+# ----------------------------------------
+# CACHE SETTINGS
+# ----------------------------------------
+DEFAULT_MAXSIZE = 64
+DEFAULT_TTL = 6 * 3600      # answers also expire when their source files change
+
+
+def file_versions(paths):
+    """(path, mtime_ns, size) for each source file; missing files count as a version too."""
+    versions = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            versions.append((p, st.st_mtime_ns, st.st_size))
+        except OSError:
+            versions.append((p, 0, -1))
+    return versions
+
+
+def make_key(*parts):
+    """Stable short key from any printable parts."""
+    raw = "\x1f".join(repr(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Size-bounded LRU with a per-entry time to live."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires, value = item
+        if monotonic() >= expires:
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        n = len(self._data)
+        self._data.clear()
+        return n
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
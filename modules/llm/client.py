@@ -0,0 +1,107 @@
+# modules/llm/client.py
+import aiohttp
+import json
+import os
+
+# ----------------------------------------
+# BACKEND ENDPOINTS (env overrides point at scripts/mock_llama_server.py)
+# ----------------------------------------
+LLAMA_URL = os.getenv("LLAMA_URL", "http://127.0.0.1:8080")
+LOCAL_API_URL = os.getenv("LOCAL_API_URL", "http://127.0.0.1:5005")
+
+# ----------------------------------------
+# POOL SETTINGS
+# ----------------------------------------
+CONNECTION_LIMIT = 8        # total open sockets (llama-server + local_api)
+KEEPALIVE_SECONDS = 60      # keep idle connections warm between DMs
+CONNECT_TIMEOUT = 5         # both servers are on localhost
+
+COMPLETION_TIMEOUT = 180    # 350 tokens on the phone CPU
+LOCAL_API_TIMEOUT = 10
+
+_session = None
+
+
+class HTTPStatusError(Exception):
+    """Non-2xx answer (e.g. 503 while llama-server loads its model)."""
+
+    def __init__(self, status, text=""):
+        super().__init__(f"HTTP {status} {text[:80]}".strip())
+        self.status = status
+
+
+def _timeout(total):
+    return aiohttp.ClientTimeout(total=total, connect=CONNECT_TIMEOUT)
+
+
+async def start_session():
+    """Create the shared session. Call once from setup_hook."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            keepalive_timeout=KEEPALIVE_SECONDS,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        print("[LLM] HTTP pool started.")
+    return _session
+
+
+async def close_session():
+    """Close the shared session on shutdown."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        print("[LLM] HTTP pool closed.")
+    _session = None
+
+
+async def get_session():
+    """Return the shared session, creating it lazily if needed."""
+    if _session is None or _session.closed:
+        return await start_session()
+    return _session
+
+
+async def post_json(url, payload, timeout=COMPLETION_TIMEOUT):
+    """POST JSON through the pool and return the raw response text (non-2xx raises)."""
+    s = await get_session()
+    async with s.post(url, json=payload, timeout=_timeout(timeout)) as r:
+        text = await r.text()
+        if not 200 <= r.status < 300:
+            raise HTTPStatusError(r.status, text)
+        return text
+
+
+async def stream_json(url, payload, timeout=COMPLETION_TIMEOUT):
+    """POST with stream=true and yield each server-sent `data:` chunk as a dict."""
+    s = await get_session()
+    body = dict(payload, stream=True)
+    async with s.post(url, json=body, timeout=_timeout(timeout)) as r:
+        if not 200 <= r.status < 300:
+            raise HTTPStatusError(r.status, await r.text())
+        async for raw in r.content:
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if not line.startswith("data:"):
+                continue
+            chunk = line[5:].strip()
+            if chunk == "[DONE]":
+                return
+            try:
+                yield json.loads(chunk)
+            except ValueError:
+                continue
+
+
+async def get_status(url, timeout=5):
+    """GET through the pool; returns (status, text)."""
+    s = await get_session()
+    async with s.get(url, timeout=_timeout(timeout)) as r:
+        return r.status, await r.text()
+
+
+async def post_status(url, payload, timeout=COMPLETION_TIMEOUT):
+    """POST JSON through the pool; returns (status, text)."""
+    s = await get_session()
+    async with s.post(url, json=payload, timeout=_timeout(timeout)) as r:
+        return r.status, await r.text()
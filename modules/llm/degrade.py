@@ -0,0 +1,100 @@
+# modules/llm/degrade.py
+from time import monotonic
+
+from config import (
+    LOAD_ENTER_QUEUE, LOAD_ENTER_WAIT_MS, LOAD_EXIT_WAIT_MS, LOAD_SLOW_FRACTION, LOAD_SLOW_TPS,
+)
+from modules.llm.metrics import llm_metrics, percentile
+from modules.llm.scheduler import llm_scheduler, INTERACTIVE, COMMAND
+
+# ----------------------------------------
+# LOAD TIERS
+# ----------------------------------------
+NORMAL = "normal"
+DEGRADED = "degraded"
+
+WINDOW = 120                # seconds of recent completions considered
+ENTER_QUEUE = LOAD_ENTER_QUEUE          # people waiting (DM + commands) → degrade
+ENTER_WAIT_MS = LOAD_ENTER_WAIT_MS      # recent p95 queue wait → degrade
+EXIT_WAIT_MS = LOAD_EXIT_WAIT_MS        # recover only once waits are short again ...
+HOLD_SECONDS = 60                       # ... and the degraded tier has lasted this long
+BASELINE_MIN_SAMPLES = 20   # completions needed before "slow" is judged
+
+DEGRADED_PROFILE = "chat-lite"
+DEGRADED_PROMPT_BUDGET = 1200   # identity + message + a short memory tail
+DEGRADED_MEMORY_BUDGET = 250    # recalled memory tokens (no embedding re-rank)
+DEGRADED_NOTE = "\n\n-# ⚡ Busy right now — short reply, trimmed memory."
+
+
+def _main_model(caller):
+    # Routed utility calls are labelled caller@model (see ask_qwen)
+    return "@" not in caller
+
+
+class LoadGovernor:
+    """
+    Picks the reply tier from queue depth, recent queue waits and recent
+    tokens/sec. Tokens/sec is compared with this machine's usual speed
+    (median of the longer per-caller history), so a slow phone is not
+    "overloaded" just for being slow. Switches to DEGRADED as soon as any signal is over its
+    limit and back to NORMAL only when the queue is empty, waits are
+    short and HOLD_SECONDS have passed (no flapping at the threshold).
+    """
+
+    def __init__(self, scheduler=llm_scheduler, metrics=llm_metrics):
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.state = NORMAL
+        self.since = monotonic()
+        self.switches = 0
+
+    def pressure(self):
+        waits = self.metrics.recent_values("queue_ms", WINDOW, _main_model)
+        tps = self.metrics.recent_values("gen_tps", WINDOW, _main_model)
+        return {
+            "queued": self.scheduler.queue_depth(INTERACTIVE) + self.scheduler.queue_depth(COMMAND),
+            "wait_p95_ms": percentile(waits, 95) if waits else 0.0,
+            "tps_p50": percentile(tps, 50) if tps else None,
+            "slow_below": self.slow_tps(),
+        }
+
+    def slow_tps(self):
+        """Generation speed that counts as slow, or None until there is a baseline."""
+        if LOAD_SLOW_TPS is not None:
+            return LOAD_SLOW_TPS
+        usual = [v for caller, series in self.metrics.series.items() if _main_model(caller)
+                 for v in series["gen_tps"]]
+        if len(usual) < BASELINE_MIN_SAMPLES:
+            return None
+        return LOAD_SLOW_FRACTION * percentile(usual, 50)
+
+    def _switch(self, state, p):
+        self.state = state
+        self.since = monotonic()
+        self.switches += 1
+        print(f"[LOAD] → {state} (queued={p['queued']}, wait p95={p['wait_p95_ms']:.0f}ms, "
+              f"tps p50={p['tps_p50']})")
+
+    def tier(self):
+        p = self.pressure()
+        slow = (p["tps_p50"] is not None and p["slow_below"] is not None
+                and p["tps_p50"] < p["slow_below"])
+        overloaded = p["queued"] >= ENTER_QUEUE or p["wait_p95_ms"] >= ENTER_WAIT_MS or slow
+
+        if self.state == NORMAL and overloaded:
+            self._switch(DEGRADED, p)
+        elif (self.state == DEGRADED and not overloaded
+              and p["queued"] == 0 and p["wait_p95_ms"] < EXIT_WAIT_MS
+              and monotonic() - self.since >= HOLD_SECONDS):
+            self._switch(NORMAL, p)
+        return self.state
+
+    def degraded(self):
+        return self.tier() == DEGRADED
+
+    def stats(self):
+        return dict(self.pressure(), state=self.state, switches=self.switches,
+                    for_s=round(monotonic() - self.since))
+
+
+load_governor = LoadGovernor()
@@ -0,0 +1,149 @@
+# modules/llm/health.py
+import asyncio
+from time import monotonic
+
+from modules.llm.client import LLAMA_URL, LOCAL_API_URL, get_status
+
+# ----------------------------------------
+# BREAKER STATES
+# ----------------------------------------
+CLOSED = "closed"           # normal traffic
+OPEN = "open"               # fail fast, backend considered down
+HALF_OPEN = "half-open"     # one trial request allowed through
+
+FAILURE_THRESHOLD = 3       # consecutive failures before opening
+RESET_TIMEOUT = 30          # seconds open before a trial request
+PROBE_INTERVAL = 10
+PROBE_TIMEOUT = 3
+
+
+class CircuitOpen(Exception):
+    """Raised when a request reaches a backend whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.last_error = ""
+
+    def _set(self, state):
+        if state != self.state:
+            print(f"[HEALTH] {self.name}: {self.state} → {state}")
+            self.state = state
+
+    def allow(self):
+        """True if a request may go to the backend right now."""
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and monotonic() - self.opened_at >= self.reset_timeout:
+            self._set(HALF_OPEN)
+
+        if self.state == HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+
+        return False
+
+    def ready(self):
+        """Like allow(), but without claiming the half-open trial."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return monotonic() - self.opened_at >= self.reset_timeout
+        return not self.trial_in_flight
+
+    def release_trial(self):
+        """The granted trial ended without a verdict (the request was cancelled)."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.trial_in_flight = False
+        self._set(CLOSED)
+
+    def record_failure(self, error=""):
+        self.failures += 1
+        self.trial_in_flight = False
+        self.last_error = str(error)[:200]
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip(error)
+
+    def trip(self, error=""):
+        self.opened_at = monotonic()
+        self.last_error = str(error)[:200] or self.last_error
+        self._set(OPEN)
+
+    def is_open(self):
+        return self.state != CLOSED
+
+
+local_api_breaker = CircuitBreaker("local_api")
+
+# (breaker, probe coroutine function) pairs polled by health_loop
+PROBES = []
+
+
+def register_probe(breaker, probe):
+    PROBES.append((breaker, probe))
+
+
+# ----------------------------------------
+# PROBES
+# ----------------------------------------
+async def probe_llama(url=LLAMA_URL):
+    """llama-server /health answers 200 once the model is loaded, 503 while loading."""
+    try:
+        status, text = await get_status(f"{url}/health", timeout=PROBE_TIMEOUT)
+    except Exception as e:
+        return False, str(e) or type(e).__name__
+    if status != 200:
+        return False, f"HTTP {status} {text[:80]}"
+    return True, ""
+
+
+async def probe_local_api():
+    """local_api has no health route; any HTTP answer means Flask is up."""
+    try:
+        await get_status(LOCAL_API_URL + "/", timeout=PROBE_TIMEOUT)
+        return True, ""
+    except Exception as e:
+        return False, str(e) or type(e).__name__
+
+
+register_probe(local_api_breaker, probe_local_api)
+
+
+async def _apply(breaker, probe):
+    ok, err = await probe()
+    if ok:
+        if breaker.is_open():
+            breaker.record_success()
+    else:
+        # A failed probe is conclusive; don't wait for user requests to fail.
+        # Re-tripping an open breaker restarts its reset timer, so a backend
+        # that is still down never gets offered a half-open trial.
+        breaker.trip(err)
+
+
+async def probe_all():
+    """One pass over every registered probe."""
+    for breaker, probe in PROBES:
+        await _apply(breaker, probe)
+
+
+async def health_loop(interval=PROBE_INTERVAL):
+    """Run by every process that sends LLM traffic (bot.py, OCR interpreter, scheduler)."""
+    print("[HEALTH] Prober started.")
+    while True:
+        try:
+            await probe_all()
+        except Exception as e:
+            print("[HEALTH ERROR]:", e)
+        await asyncio.sleep(interval)
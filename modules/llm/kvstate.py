@@ -0,0 +1,218 @@
+# modules/llm/kvstate.py
+import asyncio
+import json
+import os
+
+from modules.llm.client import get_status, post_json, post_status
+from modules.llm.health import CLOSED
+from modules.llm.pool import llm_pool
+from modules.state.aio import bot_io
+
+# ----------------------------------------
+# KV SLOT PERSISTENCE
+# llama-server must run with --slot-save-path (see start_services.sh);
+# filenames below are relative to that directory.
+# ----------------------------------------
+SNAPSHOT_INTERVAL = 15 * 60     # seconds between timed snapshots
+SAVE_TIMEOUT = 60               # writing a full slot is a few hundred MB on CPU
+BOOT_ATTEMPTS = 30              # model may still be loading when the bot starts
+BOOT_RETRY_SECONDS = 10
+WARMUP_TIMEOUT = 300
+
+
+def snapshot_name(backend, slot_id):
+    return f"blt_{backend.name}_slot{slot_id}.bin"
+
+
+def slot_fingerprint(slot):
+    """What /slots says about a slot's contents; changes whenever its KV does."""
+    # n_past/prompt on older servers, id_task/next_token on newer ones
+    return json.dumps({k: slot.get(k) for k in ("n_past", "prompt", "id_task", "next_token")},
+                      sort_keys=True, default=str)
+
+
+class KVState:
+    """
+    Saves each llama-server slot's KV cache to disk and restores it at boot,
+    so the identity prefix and the last DM sessions survive a restart.
+    Slots with nothing to restore are warmed with the static identity prefix.
+    A slot is only re-saved when /slots shows it changed since its last
+    snapshot (each save is tens to hundreds of MB on the phone's flash).
+    """
+
+    def __init__(self, pool=llm_pool, pins=None, pins_path="dm_slots.json", io=bot_io):
+        self.pool = pool
+        self.io = io                # pin file reads/writes run on the I/O pool
+        self.pins = pins            # SlotPinner whose user → slot map is saved too
+        self.pins_path = pins_path
+        self.unsupported = set()    # backends started without --slot-save-path
+        self.on_disk = {}           # (backend, slot id) -> fingerprint of the saved snapshot
+        self.saved = 0
+        self.unchanged = 0
+        self.restored = 0
+        self.warmed = 0
+
+    # -------------------------
+    # llama-server calls
+    # -------------------------
+    async def _action(self, backend, slot_id, action):
+        url = f"{backend.url}/slots/{slot_id}?action={action}"
+        status, text = await post_status(
+            url, {"filename": snapshot_name(backend, slot_id)}, timeout=SAVE_TIMEOUT
+        )
+        if status == 501:
+            # "This server does not support slots action" → no --slot-save-path
+            self.unsupported.add(backend.name)
+            print(f"[KV] {backend.name}: slot save/restore disabled on this server")
+        return status, text
+
+    async def _slots(self, backend):
+        """slot id -> /slots entry, or None if the server did not answer."""
+        status, text = await get_status(f"{backend.url}/slots", timeout=5)
+        if status != 200:
+            return None
+        return {s.get("id"): s for s in json.loads(text)}
+
+    # -------------------------
+    # Save / restore / warmup
+    # -------------------------
+    async def save_all(self):
+        """Snapshot every idle slot that changed since its last snapshot."""
+        for b in self.pool.backends:
+            if b.name in self.unsupported or b.breaker.state != CLOSED:
+                continue
+            try:
+                slots = await self._slots(b)
+                if slots is None:
+                    continue
+                for slot_id in range(b.slots):
+                    slot = slots.get(slot_id)
+                    if slot is None or slot.get("is_processing") or slot.get("state", 0) != 0:
+                        continue
+                    fp = slot_fingerprint(slot)
+                    if self.on_disk.get((b.name, slot_id)) == fp:
+                        self.unchanged += 1
+                        continue
+                    status, text = await self._action(b, slot_id, "save")
+                    if status == 501:
+                        break
+                    if status == 200:
+                        self.saved += 1
+                        self.on_disk[(b.name, slot_id)] = fp
+                    else:
+                        print(f"[KV] save {b.name}/{slot_id} → HTTP {status}: {text[:120]}")
+            except Exception as e:
+                print(f"[KV] save on {b.name} failed:", e)
+        await self._save_pins()
+
+    async def restore_all(self):
+        """Restore saved slots; returns the global slot indexes that came back warm."""
+        warm = set()
+        for index, (name, slot_id) in enumerate(self.pool.slot_map()):
+            b = self.pool.by_name[name]
+            if b.name in self.unsupported:
+                continue
+            status, text = await self._action(b, slot_id, "restore")
+            if status == 200:
+                warm.add(index)
+                self.restored += 1
+                print(f"[KV] Restored {b.name}/{slot_id}")
+            elif status == 503:
+                raise RuntimeError("model still loading")
+            elif status != 501:
+                # Usually: no snapshot yet for this slot
+                print(f"[KV] No snapshot for {b.name}/{slot_id} (HTTP {status})")
+        await self._remember_restored(warm)
+        await self._load_pins()
+        return warm
+
+    async def _remember_restored(self, warm):
+        """A freshly restored slot matches its snapshot: don't write it back unchanged."""
+        slot_map = self.pool.slot_map()
+        for b in self.pool.backends:
+            try:
+                slots = await self._slots(b) or {}
+            except Exception:
+                continue
+            for index in warm:
+                name, slot_id = slot_map[index]
+                if name == b.name and slot_id in slots:
+                    self.on_disk[(name, slot_id)] = slot_fingerprint(slots[slot_id])
+
+    async def warmup(self, prefix, skip=()):
+        """Evaluate `prefix` into every slot not in `skip` (no tokens generated)."""
+        for index, (name, slot_id) in enumerate(self.pool.slot_map()):
+            if index in skip:
+                continue
+            b = self.pool.by_name[name]
+            payload = {"prompt": prefix, "n_predict": 0, "cache_prompt": True, "id_slot": slot_id}
+            try:
+                await post_json(f"{b.url}/completion", payload, timeout=WARMUP_TIMEOUT)
+                self.warmed += 1
+                print(f"[KV] Warmed {b.name}/{slot_id} with the identity prefix")
+            except Exception as e:
+                print(f"[KV] warmup {b.name}/{slot_id} failed:", e)
+
+    async def boot(self, prefix):
+        """Restore snapshots (waiting out model load), then warm the rest."""
+        for _ in range(BOOT_ATTEMPTS):
+            try:
+                warm = await self.restore_all()
+                break
+            except Exception as e:
+                print(f"[KV] Restore not possible yet ({e}); retrying in {BOOT_RETRY_SECONDS}s")
+                await asyncio.sleep(BOOT_RETRY_SECONDS)
+        else:
+            return
+        await self.warmup(prefix, skip=warm)
+
+    async def loop(self, prefix, interval=SNAPSHOT_INTERVAL):
+        await self.boot(prefix)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save_all()
+            except Exception as e:
+                print("[KV ERROR]:", e)
+
+    # -------------------------
+    # DM user → slot pins
+    # -------------------------
+    def _write_pins(self, snapshot):
+        tmp = self.pins_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.pins_path)
+
+    def _read_pins(self):
+        if not os.path.exists(self.pins_path):
+            return None
+        try:
+            return json.load(open(self.pins_path, "r", encoding="utf-8"))
+        except:
+            return None
+
+    async def _save_pins(self):
+        if self.pins is None:
+            return
+        # Snapshot on the loop (the pinner is not thread-safe), write off it
+        await self.io.run(self._write_pins, self.pins.snapshot())
+
+    async def _load_pins(self):
+        if self.pins is None:
+            return
+        data = await self.io.run(self._read_pins)
+        try:
+            if data is not None:
+                self.pins.restore(data)
+        except:
+            pass
+
+    def stats(self):
+        return {
+            "saved": self.saved,
+            "unchanged": self.unchanged,
+            "restored": self.restored,
+            "warmed": self.warmed,
+            "unsupported": sorted(self.unsupported),
+        }
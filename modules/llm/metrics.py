@@ -0,0 +1,90 @@
+# modules/llm/metrics.py
+from collections import deque
+from time import monotonic
+
+# ----------------------------------------
+# METRICS
+# ----------------------------------------
+SAMPLES = 200               # rolling window per caller per metric
+RECENT_SAMPLES = 100        # time-stamped samples across all callers (load tracking)
+
+METRICS = (
+    "queue_ms",             # waiting for a scheduler slot
+    "ttft_ms",              # request start → first token
+    "prompt_ms",            # llama-server prompt evaluation
+    "gen_tps",              # generated tokens / second
+    "total_ms",             # request start → done
+)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class LatencyStats:
+    """Rolling per-caller samples of each metric."""
+
+    def __init__(self, samples=SAMPLES):
+        self.samples = samples
+        self.series = {}    # caller -> {metric: deque}
+        self.counts = {}    # caller -> completions recorded
+        self.recent = deque(maxlen=RECENT_SAMPLES)  # (monotonic(), caller, values)
+
+    def _caller(self, caller):
+        if caller not in self.series:
+            self.series[caller] = {m: deque(maxlen=self.samples) for m in METRICS}
+            self.counts[caller] = 0
+        return self.series[caller]
+
+    def record(self, caller, **values):
+        series = self._caller(caller)
+        self.counts[caller] += 1
+        for name, value in values.items():
+            if name in series and value is not None:
+                series[name].append(float(value))
+        self.recent.append((monotonic(), caller, values))
+
+    def recent_values(self, metric, window, callers=None):
+        """Values of one metric recorded in the last `window` seconds."""
+        cutoff = monotonic() - window
+        return [
+            float(values[metric])
+            for t, caller, values in self.recent
+            if t >= cutoff and values.get(metric) is not None
+            and (callers is None or callers(caller))
+        ]
+
+    def record_completion(self, caller, queue_s, total_s, timings=None, ttft_s=None):
+        """One finished llama-server call; `timings` is the server's timings block."""
+        timings = timings or {}
+        prompt_ms = timings.get("prompt_ms")
+        if ttft_s is None and prompt_ms is not None:
+            # Non-streaming: server-side prompt eval is when the first token appears
+            ttft_s = queue_s + prompt_ms / 1000
+
+        self.record(
+            caller,
+            queue_ms=queue_s * 1000,
+            ttft_ms=None if ttft_s is None else ttft_s * 1000,
+            prompt_ms=prompt_ms,
+            gen_tps=timings.get("predicted_per_second"),
+            total_ms=total_s * 1000,
+        )
+
+    def summary(self):
+        """{caller: {"count": n, metric: (p50, p95)}}"""
+        out = {}
+        for caller, series in self.series.items():
+            row = {"count": self.counts[caller]}
+            for name, values in series.items():
+                vals = list(values)
+                row[name] = (percentile(vals, 50), percentile(vals, 95)) if vals else None
+            out[caller] = row
+        return out
+
+
+llm_metrics = LatencyStats()
@@ -0,0 +1,163 @@
+# modules/llm/pool.py
+import asyncio
+import os
+from functools import partial
+
+from config import LLAMA_BACKENDS
+from modules.llm.client import LLAMA_URL, HTTPStatusError, post_json
+from modules.llm.health import CircuitBreaker, CircuitOpen, CLOSED, probe_llama, register_probe
+
+# ----------------------------------------
+# POOL SETTINGS
+# ----------------------------------------
+MAX_ATTEMPTS = 2            # first try + one retry on another backend
+
+
+class Backend:
+    def __init__(self, name, url, slots=1):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.slots = slots
+        self.outstanding = 0
+        self.served = 0
+        self.failed = 0
+        self.breaker = CircuitBreaker(f"llama:{name}")
+        register_probe(self.breaker, partial(probe_llama, self.url))
+
+    def load(self):
+        return self.outstanding / max(1, self.slots)
+
+
+class BackendPool:
+    """
+    Routes llama-server requests across instances: least outstanding
+    requests per slot, skipping backends whose breaker is open, with
+    optional stickiness to the instance that holds a session's cache.
+    """
+
+    def __init__(self, backends):
+        self.backends = [Backend(b["name"], b["url"], b.get("slots", 1)) for b in backends]
+        self.by_name = {b.name: b for b in self.backends}
+
+    # -------------------------
+    # Capacity / slots
+    # -------------------------
+    def total_slots(self):
+        return sum(b.slots for b in self.backends)
+
+    def slot_map(self):
+        """Global slot index -> (backend name, that server's id_slot)."""
+        return [(b.name, i) for b in self.backends for i in range(b.slots)]
+
+    def available(self):
+        """At least one backend may take a request (does not claim a trial)."""
+        return any(b.breaker.ready() for b in self.backends)
+
+    # -------------------------
+    # Routing
+    # -------------------------
+    def pick(self, prefer=None, exclude=()):
+        candidates = [b for b in self.backends if b.name not in exclude]
+
+        preferred = self.by_name.get(prefer)
+        if preferred in candidates and preferred.breaker.state == CLOSED:
+            return preferred
+
+        healthy = [b for b in candidates if b.breaker.state == CLOSED]
+        if healthy:
+            return min(healthy, key=Backend.load)
+
+        # Everything is open/half-open: let one trial through if allowed
+        for b in candidates:
+            if b.breaker.allow():
+                return b
+        return None
+
+    def route(self, payload, prefer=None, exclude=()):
+        """(backend, payload to send) or (None, None) when nothing is available."""
+        b = self.pick(prefer=prefer, exclude=exclude)
+        if b is None:
+            return None, None
+        if b.name != prefer and "id_slot" in payload:
+            # Slot ids only mean something on the instance they were pinned to
+            payload = {k: v for k, v in payload.items() if k != "id_slot"}
+        return b, payload
+
+    def slot_target(self, index):
+        """(backend name, id_slot) for a global slot index from slot_map()."""
+        return self.slot_map()[index % self.total_slots()]
+
+    async def post(self, path, payload, prefer=None, idempotent=True, timeout=None):
+        """
+        POST to the best backend; on a transport failure or 5xx retry once
+        on another backend if the request is idempotent. A 4xx is the
+        request's fault, not the backend's, and is raised as is.
+        Returns (backend, raw).
+        """
+        tried = []
+        last_error = None
+
+        for _ in range(MAX_ATTEMPTS if idempotent else 1):
+            b, body = self.route(payload, prefer=prefer, exclude=tried)
+            if b is None:
+                break
+
+            b.outstanding += 1
+            try:
+                kwargs = {} if timeout is None else {"timeout": timeout}
+                raw = await post_json(b.url + path, body, **kwargs)
+            except asyncio.CancelledError:
+                # Caller gave up: no verdict on the backend, free a half-open trial
+                b.breaker.release_trial()
+                raise
+            except HTTPStatusError as e:
+                if e.status < 500:
+                    b.served += 1
+                    b.breaker.record_success()
+                    raise
+                b.failed += 1
+                b.breaker.record_failure(e)
+                tried.append(b.name)
+                last_error = e
+                print(f"[POOL] {b.name} failed: {e}")
+                continue
+            except Exception as e:
+                b.failed += 1
+                b.breaker.record_failure(e)
+                tried.append(b.name)
+                last_error = e
+                print(f"[POOL] {b.name} failed: {e}")
+                continue
+            finally:
+                b.outstanding -= 1
+
+            b.served += 1
+            b.breaker.record_success()
+            return b, raw
+
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpen()
+
+    def stats(self):
+        return [
+            {
+                "name": b.name,
+                "state": b.breaker.state,
+                "outstanding": b.outstanding,
+                "slots": b.slots,
+                "served": b.served,
+                "failed": b.failed,
+            }
+            for b in self.backends
+        ]
+
+
+def _configured_backends():
+    # LLAMA_URL in the environment (e.g. the mock server) replaces the config list
+    if os.getenv("LLAMA_URL") or not LLAMA_BACKENDS:
+        return [{"name": "main", "url": LLAMA_URL, "slots": 2}]
+    return LLAMA_BACKENDS
+
+
+llm_pool = BackendPool(_configured_backends())
@@ -0,0 +1,210 @@
+# modules/llm/pregen.py
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from modules.llm.client import get_status
+from modules.llm.health import CLOSED
+from modules.llm.router import MODEL_POOLS, MODEL_SCHEDULERS
+from modules.state.aio import bot_io
+
+# ----------------------------------------
+# PRE-GENERATION SETTINGS
+# ----------------------------------------
+CHECK_INTERVAL = 30         # seconds between idle checks
+SLOTS_TIMEOUT = 3
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def next_daily(hhmm, tz=None):
+    """Next occurrence of a local HH:MM (tz=None → system local time), as aware UTC."""
+    hh, mm = (int(x) for x in hhmm.split(":"))
+    now = datetime.now(tz) if tz else datetime.now().astimezone()
+    due = now.replace(hour=hh, minute=mm, second=0, microsecond=0)
+    if due <= now:
+        due += timedelta(days=1)
+    return due.astimezone(timezone.utc)
+
+
+class PregenStore:
+    """
+    Small JSON-backed store: key -> {"value", "for", "expires"}.
+    put() and take() write the file, so they run on the I/O pool; has()
+    only reads memory and is safe on the event loop. Every access holds a
+    lock and the file is replaced atomically.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            self.entries = json.load(open(self.path, "r", encoding="utf-8"))
+        except:
+            self.entries = {}
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _fresh(self, key):
+        e = self.entries.get(key)
+        if not e:
+            return None
+        if datetime.fromisoformat(e["expires"]) <= _now():
+            # Dropped from memory only; the next put()/take() rewrites the file
+            del self.entries[key]
+            return None
+        return e
+
+    def has(self, key, for_due=None):
+        with self._lock:
+            e = self._fresh(key)
+            return e is not None and (for_due is None or e.get("for") == for_due)
+
+    def put(self, key, value, ttl, for_due=None):
+        with self._lock:
+            self.entries[key] = {
+                "value": value,
+                "for": for_due,
+                "expires": (_now() + timedelta(seconds=ttl)).isoformat(),
+            }
+            self._save()
+
+    def take(self, key):
+        """Pop a fresh value, or None."""
+        with self._lock:
+            e = self._fresh(key)
+            if e is None:
+                return None
+            del self.entries[key]
+            self._save()
+            return e["value"]
+
+
+class PregenEngine:
+    """
+    Generates scheduled content ahead of time while llama-server is idle.
+
+    Jobs with a `next_due` callable are built within `lead` seconds of their
+    publish time; jobs without one are "evergreen" and kept filled whenever
+    the stored value is missing or expired.
+
+    Evergreen jobs registered with `after_take` are only rebuilt once their
+    value has been taken, no sooner than `after_take` seconds later — for
+    content consumed rarely (e.g. once per process start), so an unused
+    value is not regenerated every time it expires.
+    """
+
+    def __init__(self, store, io=bot_io):
+        self.store = store
+        self.io = io
+        self.jobs = {}
+        self.taken_at = {}      # key -> when an after_take job was last consumed
+        self.built = 0
+        self.skipped_busy = 0
+
+    def register(self, key, build, ttl, next_due=None, lead=15 * 60, after_take=None):
+        self.jobs[key] = {"build": build, "ttl": ttl, "next_due": next_due, "lead": lead,
+                          "after_take": after_take}
+
+    def take(self, key):
+        value = self.store.take(key)
+        if key in self.jobs and self.jobs[key]["after_take"] is not None:
+            self.taken_at[key] = _now()
+        print(f"[PREGEN] {key}: {'hit' if value is not None else 'miss → live generation'}")
+        return value
+
+    def _wants_refill(self, key, job):
+        """Evergreen job: missing value, and (after_take jobs) consumed long enough ago."""
+        if self.store.has(key):
+            return False
+        if job["after_take"] is None:
+            return True
+        taken = self.taken_at.get(key)
+        return taken is not None and _now() - taken >= timedelta(seconds=job["after_take"])
+
+    async def is_idle(self):
+        """
+        No local queue and no busy slot on any healthy llama-server (any
+        model). Backends that cannot be reached (or have /slots disabled)
+        are skipped; at least one has to answer.
+        """
+        for scheduler in MODEL_SCHEDULERS.values():
+            if scheduler.queue_depth() or sum(scheduler.active.values()):
+                return False
+        healthy = [b for pool in MODEL_POOLS.values() for b in pool.backends
+                   if b.breaker.state == CLOSED]
+        answered = 0
+        for b in healthy:
+            try:
+                status, text = await get_status(f"{b.url}/slots", timeout=SLOTS_TIMEOUT)
+                slots = json.loads(text) if status == 200 else None
+            except Exception:
+                continue
+            if not isinstance(slots, list):
+                continue
+            answered += 1
+            for slot in slots:
+                # newer servers: is_processing; older: state (0 = idle)
+                if slot.get("is_processing") or slot.get("state", 0) != 0:
+                    return False
+        return answered > 0
+
+    def _pending(self):
+        """Jobs that want a value now, soonest publish time first."""
+        now = _now()
+        out = []
+        for key, job in self.jobs.items():
+            if job["next_due"] is None:
+                if self._wants_refill(key, job):
+                    out.append((now + timedelta(days=365), key, None, job))
+                continue
+            due = job["next_due"]()
+            if due - now > timedelta(seconds=job["lead"]):
+                continue
+            tag = due.isoformat()
+            if not self.store.has(key, for_due=tag):
+                out.append((due, key, tag, job))
+        return sorted(out, key=lambda x: x[0])
+
+    async def run_once(self):
+        for due, key, tag, job in self._pending():
+            if not await self.is_idle():
+                self.skipped_busy += 1
+                return
+            try:
+                value = await job["build"]()
+            except Exception as e:
+                print(f"[PREGEN] {key} build failed:", e)
+                continue
+            if value:
+                ttl = job["ttl"]
+                if tag is not None:
+                    # Keep it until a little after its publish time
+                    ttl = max(ttl, (due - _now()).total_seconds() + 300)
+                await self.io.run(self.store.put, key, value, ttl, tag)
+                self.taken_at.pop(key, None)
+                self.built += 1
+                print(f"[PREGEN] Built {key} (for {tag or 'next use'})")
+
+    async def loop(self, interval=CHECK_INTERVAL):
+        print("[PREGEN] Engine started.")
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print("[PREGEN ERROR]:", e)
+            await asyncio.sleep(interval)
@@ -0,0 +1,54 @@
+# modules/llm/profiles.py
+# Plain data only: also imported by local_api/api_agent.py (no aiohttp there).
+
+# ----------------------------------------
+# GENERATION PROFILES
+# n_predict + sampling per kind of output. Measure changes with
+#   python scripts/bench_llm.py --profiles
+# ----------------------------------------
+_CHAT_SAMPLING = {
+    "temperature": 0.48,
+    "top_k": 40,
+    "top_p": 0.92,
+    "min_p": 0.06,
+    "repeat_penalty": 1.12,
+}
+
+PROFILES = {
+    # DM conversation: the full-length MadOS reply
+    "chat-deep": dict(_CHAT_SAMPLING, n_predict=350),
+    # Slash-command answers: same voice, a third of the tokens
+    "chat-fast": dict(_CHAT_SAMPLING, n_predict=160),
+    # Any chat while the bot is overloaded (modules/llm/degrade.py)
+    "chat-lite": dict(_CHAT_SAMPLING, n_predict=120),
+    # Numbered reminder lines (/bt_generate_lines): stop before a 6th line
+    "lines": dict(_CHAT_SAMPLING, n_predict=140, stop=["\n6."]),
+    # Diary entries: a little looser, one paragraph or two
+    "diary": dict(_CHAT_SAMPLING, n_predict=300, temperature=0.6),
+    # Event announcements / agent answers
+    "summary": dict(_CHAT_SAMPLING, n_predict=256, temperature=0.55),
+    # Rolling DM memory summaries (modules/chat/summarize.py): short and factual
+    "memory": dict(_CHAT_SAMPLING, n_predict=200, temperature=0.3, stop=["\nUser:", "\nBot:"]),
+    # Structured extraction (OCR → JSON): near-greedy, no repeat penalty
+    "extract": {
+        "n_predict": 256,
+        "temperature": 0.2,
+        "top_k": 20,
+        "top_p": 0.9,
+        "min_p": 0.05,
+        "repeat_penalty": 1.0,
+    },
+}
+
+
+def profile_params(name, stop=None, **overrides):
+    """
+    Sampling fields for a profile, ready to merge into a /completion payload.
+    `stop` is added to the profile's own stop strings; keyword overrides win.
+    """
+    params = dict(PROFILES[name])
+    stops = list(stop or []) + [s for s in params.pop("stop", []) if s not in (stop or [])]
+    if stops:
+        params["stop"] = stops
+    params.update(overrides)
+    return params
@@ -0,0 +1,54 @@
+# modules/llm/router.py
+import os
+
+from config import LLAMA_EMBED_BACKENDS, LLAMA_SMALL_BACKENDS, LLM_TASK_ROUTES
+from modules.llm.pool import BackendPool, llm_pool
+from modules.llm.scheduler import LLMScheduler, llm_scheduler
+
+# ----------------------------------------
+# MODEL ROUTING
+# ----------------------------------------
+MAIN = "main"
+SMALL = "small"
+EMBED = "embed"             # /embedding only (semantic DM cache); never a completion fallback
+
+
+def _backends(env, configured, name, slots=2):
+    # LLAMA_SMALL_URL / LLAMA_EMBED_URL in the environment (e.g. a mock server) replace the config list
+    url = os.getenv(env)
+    if url:
+        return [{"name": name, "url": url, "slots": slots}]
+    return configured
+
+
+# Each model has its own backends and its own admission control:
+# utility tasks queue for the small model's slots, not the 3B model's.
+MODEL_POOLS = {MAIN: llm_pool}
+MODEL_SCHEDULERS = {MAIN: llm_scheduler}
+
+for _model, _env, _configured in (
+    (SMALL, "LLAMA_SMALL_URL", LLAMA_SMALL_BACKENDS),
+    (EMBED, "LLAMA_EMBED_URL", LLAMA_EMBED_BACKENDS),
+):
+    if _backends(_env, _configured, _model):
+        MODEL_POOLS[_model] = BackendPool(_backends(_env, _configured, _model))
+        MODEL_SCHEDULERS[_model] = LLMScheduler(
+            max_concurrent=MODEL_POOLS[_model].total_slots(), name=_model)
+
+
+def model_for(task):
+    """Configured model for a task, falling back to main while it is missing or down."""
+    model = LLM_TASK_ROUTES.get(task, MAIN)
+    if model != MAIN and (model not in MODEL_POOLS or not MODEL_POOLS[model].available()):
+        return MAIN
+    return model
+
+
+def route_task(task):
+    """(model name, BackendPool, LLMScheduler) for a task / ask_qwen caller."""
+    model = model_for(task)
+    return model, MODEL_POOLS[model], MODEL_SCHEDULERS[model]
+
+
+def all_pools():
+    return list(MODEL_POOLS.items())
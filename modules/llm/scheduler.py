@@ -0,0 +1,218 @@
+# modules/llm/scheduler.py
+import asyncio
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from time import monotonic
+
+from modules.llm.metrics import percentile
+
+try:
+    import fcntl
+except ImportError:     # no flock (Windows): background limit stays per process
+    fcntl = None
+
+# ----------------------------------------
+# PRIORITY CLASSES (lower = served first)
+# ----------------------------------------
+INTERACTIVE = 0     # DM chat
+COMMAND = 1         # slash commands
+BACKGROUND = 2      # diary, scheduled summaries, OCR interpretation
+
+CLASS_NAMES = {
+    INTERACTIVE: "interactive",
+    COMMAND: "command",
+    BACKGROUND: "background",
+}
+
+# ----------------------------------------
+# LIMITS
+# ----------------------------------------
+MAX_CONCURRENT = 2          # llama-server --parallel 2
+MAX_BACKGROUND_ACTIVE = 1   # always keep one slot free for people
+MAX_QUEUED = {
+    INTERACTIVE: 8,
+    COMMAND: 6,
+    BACKGROUND: 4,
+}
+WAIT_SAMPLES = 200          # rolling window for wait-time stats
+
+# bot.py, ocr_pipeline/worker_ai.py and scripts/schedule.py each have their
+# own scheduler but share llama-server: background leases are lock files
+# in one directory, so MAX_BACKGROUND_ACTIVE holds across processes.
+LEASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "run")
+LEASE_POLL = 0.5            # seconds between tries while another process holds every lease
+
+
+class SchedulerBusy(Exception):
+    """Raised immediately when a priority class queue is full."""
+
+
+class BackgroundLeases:
+    """
+    `limit` flock()ed files shared by every process using the same model.
+    Holding one is the right to run a background job; the OS drops it
+    if the process dies, so a crash never leaks a lease.
+    """
+
+    def __init__(self, name, limit, lease_dir=LEASE_DIR):
+        self.paths = [os.path.join(lease_dir, f"llm-{name}-background-{i}.lock") for i in range(limit)]
+        self.lease_dir = lease_dir
+        self.waited = 0
+
+    def try_acquire(self):
+        """fd of a free lease, or None."""
+        os.makedirs(self.lease_dir, exist_ok=True)
+        for path in self.paths:
+            fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    async def acquire(self):
+        fd = self.try_acquire()
+        if fd is None:
+            self.waited += 1
+        while fd is None:
+            await asyncio.sleep(LEASE_POLL)
+            fd = self.try_acquire()
+        return fd
+
+    @staticmethod
+    def release(fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+class LLMScheduler:
+    """
+    Admission control in front of llama-server.
+    Waiting requests are granted slots strictly by priority class, FIFO within a class.
+    A granted background request also takes a cross-process lease (`name`
+    identifies the model), so other processes' background jobs count too.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queued=None,
+                 max_background_active=MAX_BACKGROUND_ACTIVE, name="main"):
+        self.max_concurrent = max_concurrent
+        self.max_background_active = max_background_active
+        self.max_queued = dict(max_queued or MAX_QUEUED)
+        self.leases = BackgroundLeases(name, max_background_active) if fcntl else None
+        self.held = deque()     # lease fds of running background requests
+
+        self.active = {p: 0 for p in CLASS_NAMES}
+        self.waiting = {p: deque() for p in CLASS_NAMES}
+        self.waits = {p: deque(maxlen=WAIT_SAMPLES) for p in CLASS_NAMES}
+        self.served = {p: 0 for p in CLASS_NAMES}
+        self.rejected = {p: 0 for p in CLASS_NAMES}
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _total_active(self):
+        return sum(self.active.values())
+
+    def _can_run(self, priority):
+        if self._total_active() >= self.max_concurrent:
+            return False
+        if priority == BACKGROUND and self.active[BACKGROUND] >= self.max_background_active:
+            return False
+        return True
+
+    def _has_waiting_before(self, priority):
+        return any(self.waiting[p] for p in CLASS_NAMES if p <= priority)
+
+    def _dispatch(self):
+        """Hand free slots to the highest-priority waiters."""
+        for p in sorted(CLASS_NAMES):
+            queue = self.waiting[p]
+            while queue and self._can_run(p):
+                fut = queue.popleft()
+                if fut.done():
+                    continue
+                self.active[p] += 1
+                fut.set_result(None)
+
+    # -------------------------
+    # Public API
+    # -------------------------
+    async def acquire(self, priority=COMMAND):
+        t0 = monotonic()
+
+        if self._can_run(priority) and not self._has_waiting_before(priority):
+            self.active[priority] += 1
+        else:
+            if len(self.waiting[priority]) >= self.max_queued[priority]:
+                self.rejected[priority] += 1
+                raise SchedulerBusy(CLASS_NAMES[priority])
+
+            fut = asyncio.get_running_loop().create_future()
+            self.waiting[priority].append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut in self.waiting[priority]:
+                    self.waiting[priority].remove(fut)
+                elif fut.done() and not fut.cancelled():
+                    # Slot was granted right as we were cancelled
+                    self.release(priority)
+                raise
+
+        if priority == BACKGROUND and self.leases is not None:
+            try:
+                self.held.append(await self.leases.acquire())
+            except BaseException:
+                # Cancelled while another process held every lease
+                self.active[priority] = max(0, self.active[priority] - 1)
+                self._dispatch()
+                raise
+
+        wait = monotonic() - t0
+        self.waits[priority].append(wait)
+        self.served[priority] += 1
+        return wait
+
+    def release(self, priority=COMMAND):
+        if priority == BACKGROUND and self.held:
+            self.leases.release(self.held.popleft())
+        self.active[priority] = max(0, self.active[priority] - 1)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority=COMMAND):
+        """`async with scheduler.slot(INTERACTIVE) as wait:` around one llama-server call."""
+        wait = await self.acquire(priority)
+        try:
+            yield wait
+        finally:
+            self.release(priority)
+
+    def queue_depth(self, priority=None):
+        if priority is None:
+            return sum(len(q) for q in self.waiting.values())
+        return len(self.waiting[priority])
+
+    def stats(self):
+        out = {}
+        for p, name in CLASS_NAMES.items():
+            waits = list(self.waits[p])
+            out[name] = {
+                "active": self.active[p],
+                "queued": len(self.waiting[p]),
+                "served": self.served[p],
+                "rejected": self.rejected[p],
+                "wait_p50_ms": round(percentile(waits, 50) * 1000),
+                "wait_p95_ms": round(percentile(waits, 95) * 1000),
+            }
+        # Background requests that found every lease held by another process
+        out["background"]["lease_waits"] = self.leases.waited if self.leases else 0
+        return out
+
+
+# One scheduler per process; every llama-server caller goes through it.
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,186 @@
+# modules/llm/semantic.py
+import json
+from collections import OrderedDict
+from time import monotonic
+
+try:
+    import numpy as np
+except ImportError:     # cache stays off without NumPy
+    np = None
+
+from config import DM_CACHE_SIZE, DM_CACHE_THRESHOLD, DM_CACHE_TTL
+from modules.llm.router import EMBED, MODEL_POOLS
+
+# ----------------------------------------
+# SEMANTIC CACHE SETTINGS
+# ----------------------------------------
+EMBED_TIMEOUT = 5
+MAX_QUESTION_CHARS = 200    # long, personal messages are never served from cache
+
+
+def _vector(data):
+    """Pooled embedding from either /embedding response shape."""
+    if isinstance(data, list):             # newer servers: [{"index", "embedding"}]
+        data = data[0] if data else {}
+    emb = data.get("embedding")
+    if emb and isinstance(emb[0], list):   # per-token vectors (no pooling) → mean
+        return np.mean(np.asarray(emb, dtype=np.float32), axis=0)
+    return np.asarray(emb or [], dtype=np.float32)
+
+
+async def embed_text(text):
+    """Unit vector for `text` from the embed pool, or None (no NumPy / server down)."""
+    if np is None or EMBED not in MODEL_POOLS:
+        return None
+    pool = MODEL_POOLS[EMBED]
+    if not pool.available():
+        return None
+    _, raw = await pool.post("/embedding", {"content": text}, timeout=EMBED_TIMEOUT)
+    vec = _vector(json.loads(raw))
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else None
+
+
+async def embed_texts(texts):
+    """Unit vectors for several texts from one /embedding request (None where unusable)."""
+    out = [None] * len(texts)
+    if not texts or np is None or EMBED not in MODEL_POOLS:
+        return out
+    pool = MODEL_POOLS[EMBED]
+    if not pool.available():
+        return out
+    _, raw = await pool.post("/embedding", {"content": list(texts)}, timeout=EMBED_TIMEOUT)
+    data = json.loads(raw)
+    for i, item in enumerate(data if isinstance(data, list) else [data]):
+        idx = item.get("index", i)
+        if 0 <= idx < len(texts):
+            vec = _vector(item)
+            norm = np.linalg.norm(vec)
+            out[idx] = vec / norm if norm else None
+    return out
+
+
+class SemanticCache:
+    """
+    Recent DM question→answer pairs, looked up by cosine similarity of
+    question embeddings. Vectors are L2-normalised rows of one matrix, so a
+    lookup is a single matrix-vector product. Entries expire after `ttl`
+    seconds; when full, the least recently used entry is dropped.
+
+    An answer generated with someone's memory in the prompt is stored with
+    that user as `owner` and only served back to them; answers built
+    without any memory (owner None) are shared.
+    """
+
+    def __init__(self, threshold=DM_CACHE_THRESHOLD, ttl=DM_CACHE_TTL, maxsize=DM_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()    # id -> {"question", "answer", "owner", "expires", "gen_s"}
+        self.ids = []                   # row in self.matrix -> id
+        self.owners = []                # row in self.matrix -> owner
+        self.matrix = None
+        self._next_id = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.saved_s = 0.0
+        self.embed_failures = 0
+
+    def enabled(self):
+        return np is not None and EMBED in MODEL_POOLS
+
+    # -------------------------
+    # Embeddings
+    # -------------------------
+    async def embed(self, text):
+        """Unit vector for `text`, or None when the embedding server is unavailable."""
+        try:
+            return await embed_text(text)
+        except Exception as e:
+            self.embed_failures += 1
+            print("[SEMCACHE] embedding failed:", e)
+            return None
+
+    # -------------------------
+    # Index
+    # -------------------------
+    def _rebuild(self):
+        self.ids = list(self.entries)
+        self.owners = [self.entries[eid]["owner"] for eid in self.ids]
+        self.matrix = np.stack([self.entries[eid]["vec"] for eid in self.ids]) if self.ids else None
+
+    def _expire(self):
+        now = monotonic()
+        dead = [eid for eid, e in self.entries.items() if e["expires"] <= now]
+        for eid in dead:
+            del self.entries[eid]
+        return bool(dead)
+
+    def lookup(self, vec, owner=None):
+        """
+        (answer, similarity) for the closest fresh question that is shared or
+        belongs to `owner`, or (None, best similarity).
+        """
+        self.lookups += 1
+        if self._expire():
+            self._rebuild()
+        if self.matrix is None or vec is None or vec.shape[0] != self.matrix.shape[1]:
+            return None, 0.0
+
+        sims = self.matrix @ vec
+        visible = np.array([o is None or o == owner for o in self.owners])
+        if not visible.any():
+            return None, 0.0
+        sims = np.where(visible, sims, -1.0)
+        row = int(np.argmax(sims))
+        best = float(sims[row])
+        if best < self.threshold:
+            return None, best
+
+        eid = self.ids[row]
+        entry = self.entries[eid]
+        self.entries.move_to_end(eid)
+        self.hits += 1
+        self.saved_s += entry["gen_s"]
+        return entry["answer"], best
+
+    def add(self, vec, question, answer, gen_s, owner=None):
+        if vec is None:
+            return
+        if self.matrix is not None and vec.shape[0] != self.matrix.shape[1]:
+            # Embedding model changed: start over
+            self.entries.clear()
+        self._expire()
+        while len(self.entries) >= self.maxsize:
+            self.entries.popitem(last=False)
+        self.entries[self._next_id] = {
+            "vec": vec,
+            "question": question,
+            "answer": answer,
+            "owner": owner,
+            "expires": monotonic() + self.ttl,
+            "gen_s": gen_s,
+        }
+        self._next_id += 1
+        self._rebuild()
+
+    def clear(self):
+        n = len(self.entries)
+        self.entries.clear()
+        self._rebuild()
+        return n
+
+    def stats(self):
+        return {
+            "enabled": self.enabled(),
+            "size": len(self.entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "saved_s": round(self.saved_s, 1),
+            "embed_failures": self.embed_failures,
+        }
+
+
+dm_cache = SemanticCache()
@@ -0,0 +1,53 @@
+# modules/llm/singleflight.py
+import asyncio
+import hashlib
+import json
+
+
+def payload_key(payload):
+    """Normalised key: sorted keys, prompt whitespace trimmed."""
+    norm = dict(payload)
+    if isinstance(norm.get("prompt"), str):
+        norm["prompt"] = norm["prompt"].strip()
+    raw = json.dumps(norm, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight coroutine.
+    Only the first caller starts the work; everyone gets its result.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.deduped = 0
+
+    async def do(self, key, fn):
+        self.calls += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduped += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+
+        # Shield so one caller being cancelled doesn't cancel the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "deduped": self.deduped,
+            "in_flight": len(self._inflight),
+        }
+
+
+completion_flight = SingleFlight()
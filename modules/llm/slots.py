@@ -0,0 +1,69 @@
+# modules/llm/slots.py
+from time import monotonic
+
+from modules.llm.pool import llm_pool
+
+# ----------------------------------------
+# SLOT SETTINGS
+# ----------------------------------------
+N_SLOTS = 2                 # llama-server --parallel 2
+SESSION_IDLE_SECONDS = 1800 # after this a user no longer counts against a slot
+
+
+class SlotPinner:
+    """
+    Pins each DM user to one llama-server slot so their identity + memory
+    prefix stays in that slot's KV cache between turns.
+    New users go to the slot with the fewest active users. Slot indexes are
+    global across the backend pool (see BackendPool.slot_map).
+    """
+
+    def __init__(self, n_slots=N_SLOTS, idle_seconds=SESSION_IDLE_SECONDS):
+        self.n_slots = n_slots
+        self.idle_seconds = idle_seconds
+        self.assigned = {}      # uid -> slot id
+        self.last_seen = {}     # uid -> monotonic()
+
+    def _expire_idle(self, now):
+        for uid, seen in list(self.last_seen.items()):
+            if now - seen > self.idle_seconds:
+                self.assigned.pop(uid, None)
+                self.last_seen.pop(uid, None)
+
+    def load(self):
+        """Active users per slot."""
+        counts = [0] * self.n_slots
+        for slot in self.assigned.values():
+            counts[slot] += 1
+        return counts
+
+    def slot_for(self, uid):
+        now = monotonic()
+        self._expire_idle(now)
+
+        if uid not in self.assigned:
+            counts = self.load()
+            self.assigned[uid] = counts.index(min(counts))
+            print(f"[SLOTS] User {uid} pinned to slot {self.assigned[uid]} (load={counts})")
+
+        self.last_seen[uid] = now
+        return self.assigned[uid]
+
+    def release(self, uid):
+        self.assigned.pop(uid, None)
+        self.last_seen.pop(uid, None)
+
+    def snapshot(self):
+        """{uid: slot} for persisting alongside the KV slot snapshots."""
+        return {str(uid): slot for uid, slot in self.assigned.items()}
+
+    def restore(self, mapping):
+        """Re-pin users from snapshot(); they count as seen just now."""
+        now = monotonic()
+        for uid, slot in mapping.items():
+            if 0 <= slot < self.n_slots:
+                self.assigned[int(uid)] = slot
+                self.last_seen[int(uid)] = now
+
+
+dm_slots = SlotPinner(n_slots=llm_pool.total_slots())
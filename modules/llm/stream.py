@@ -0,0 +1,65 @@
+# modules/llm/stream.py
+from contextlib import aclosing
+from time import monotonic
+
+from modules.llm.client import stream_json
+
+# ----------------------------------------
+# STREAM SETTINGS
+# ----------------------------------------
+PLACEHOLDER = "✍️ …"
+MAX_CHARS = 1900            # Discord message cap used everywhere in bot.py
+EDIT_INTERVAL = 1.3         # Discord allows ~5 edits / 5s per channel
+MIN_NEW_CHARS = 24          # skip edits that would only add a word or two
+
+
+async def stream_to_channel(channel, url, payload, stats=None, footer=""):
+    """
+    Post a placeholder, then edit it with tokens as llama-server streams them.
+    Returns the final text (already capped at MAX_CHARS, without `footer`).
+    If `stats` is a dict it receives "ttft" (seconds) and the server "timings".
+    `footer` is appended to the final edit of a successful reply.
+    """
+    t0 = monotonic()
+    msg = await channel.send(PLACEHOLDER)
+
+    text = ""
+    shown = 0
+    last_edit = monotonic()
+
+    try:
+        async with aclosing(stream_json(url, payload)) as chunks:
+            async for chunk in chunks:
+                if stats is not None:
+                    if "ttft" not in stats and chunk.get("content"):
+                        stats["ttft"] = monotonic() - t0
+                    if chunk.get("timings"):
+                        stats["timings"] = chunk["timings"]
+
+                text += chunk.get("content", "")
+
+                if len(text) >= MAX_CHARS:
+                    # Closing the stream drops the connection and stops generation
+                    text = text[:MAX_CHARS]
+                    break
+
+                if chunk.get("stop"):
+                    break
+
+                now = monotonic()
+                if now - last_edit >= EDIT_INTERVAL and len(text) - shown >= MIN_NEW_CHARS:
+                    await msg.edit(content=text.strip() or PLACEHOLDER)
+                    shown = len(text)
+                    last_edit = now
+
+    except Exception as e:
+        if not text.strip():
+            text = f"⚠️ Qwen error: {e}"
+
+    text = text.strip()
+    if text and not text.startswith("⚠️"):
+        # MAX_CHARS leaves ~100 chars under Discord's 2000 cap for the footer
+        await msg.edit(content=text + footer)
+    else:
+        await msg.edit(content=text or "(no response)")
+    return text
@@ -0,0 +1,115 @@
+# modules/llm/tokens.py
+import hashlib
+import json
+from collections import OrderedDict
+
+from modules.llm.pool import llm_pool
+
+# ----------------------------------------
+# TOKEN BUDGET
+# ----------------------------------------
+CONTEXT_SIZE = 8192         # llama-server -c 8192
+N_PARALLEL = 2              # ... split across --parallel 2 slots
+N_PREDICT = 350             # room left for the reply
+SAFETY_MARGIN = 96          # template glue, stop strings, rounding
+
+SLOT_CONTEXT = CONTEXT_SIZE // N_PARALLEL
+PROMPT_BUDGET = SLOT_CONTEXT - N_PREDICT - SAFETY_MARGIN
+
+TOKENIZE_TIMEOUT = 5
+COUNT_CACHE_SIZE = 1024
+
+_counts = OrderedDict()     # sha1(text) -> token count
+
+
+def estimate_tokens(text):
+    """Offline fallback: ~4 ASCII chars per token, ~1 token per CJK/other char."""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+async def tokenize(text):
+    """Token ids from llama-server, or None if it is unreachable."""
+    if not llm_pool.available():
+        return None
+    try:
+        _, raw = await llm_pool.post("/tokenize", {"content": text}, timeout=TOKENIZE_TIMEOUT)
+        return json.loads(raw).get("tokens")
+    except Exception as e:
+        print("[TOKENS] tokenize failed:", e)
+        return None
+
+
+async def detokenize(tokens):
+    if not llm_pool.available():
+        return None
+    try:
+        _, raw = await llm_pool.post("/detokenize", {"tokens": tokens}, timeout=TOKENIZE_TIMEOUT)
+        return json.loads(raw).get("content")
+    except Exception as e:
+        print("[TOKENS] detokenize failed:", e)
+        return None
+
+
+async def count_tokens(text):
+    """Exact token count via /tokenize, memoised in a small LRU."""
+    if not text:
+        return 0
+
+    key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    if key in _counts:
+        _counts.move_to_end(key)
+        return _counts[key]
+
+    tokens = await tokenize(text)
+    if tokens is None:
+        # Don't cache estimates; the server may be back next time
+        return estimate_tokens(text)
+
+    _counts[key] = len(tokens)
+    while len(_counts) > COUNT_CACHE_SIZE:
+        _counts.popitem(last=False)
+    return len(tokens)
+
+
+async def trim_to_tokens(text, limit, keep="head"):
+    """Cut text to at most `limit` tokens, keeping its start ("head") or end ("tail")."""
+    if limit <= 0 or not text:
+        return ""
+    if await count_tokens(text) <= limit:
+        return text
+
+    tokens = await tokenize(text)
+    if tokens is not None:
+        kept = tokens[:limit] if keep == "head" else tokens[-limit:]
+        out = await detokenize(kept)
+        if out is not None:
+            return out
+
+    # Offline: proportional character cut
+    chars = max(1, len(text) * limit // max(1, estimate_tokens(text)))
+    return text[:chars] if keep == "head" else text[-chars:]
+
+
+async def fit_segments(segments, budget=PROMPT_BUDGET):
+    """
+    segments: list of dicts {"name", "text", "keep"} in priority order
+    (most important first). Each gets what is left of the budget after
+    the ones before it. Returns {name: fitted_text}.
+    """
+    remaining = budget
+    out = {}
+
+    for seg in segments:
+        text = seg.get("text") or ""
+        n = await count_tokens(text)
+
+        if n > remaining:
+            text = await trim_to_tokens(text, remaining, keep=seg.get("keep", "head"))
+            n = await count_tokens(text)
+            print(f"[TOKENS] Trimmed '{seg['name']}' to {n} tokens (budget left {remaining})")
+
+        out[seg["name"]] = text
+        remaining = max(0, remaining - n)
+
+    return out
@@ -0,0 +1,79 @@
+# modules/state/aio.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# ----------------------------------------
+# FILE I/O OFF THE EVENT LOOP
+# ----------------------------------------
+IO_WORKERS = 3              # phone flash: a few parallel readers, not dozens
+COMMIT_WINDOW = 0.05        # seconds writes for the same key are gathered
+
+
+class IOPool:
+    """Bounded thread pool for blocking file reads/writes from async code."""
+
+    def __init__(self, max_workers=IO_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bot-io")
+        self.calls = 0
+
+    async def run(self, fn, *args):
+        self.calls += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class GroupCommit:
+    """
+    Gathers writes for the same key that arrive within `window` seconds and
+    hands them to `flush(key, items)` as one call on the I/O pool, e.g. two
+    memory turns → one append + one fsync. `submit` returns once the batch
+    containing the item is on disk (or raises what the flush raised).
+    """
+
+    def __init__(self, io, flush, window=COMMIT_WINDOW):
+        self.io = io
+        self.flush = flush
+        self.window = window
+        self.pending = {}       # key -> [(item, future)]
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, key, item):
+        fut = asyncio.get_running_loop().create_future()
+        batch = self.pending.setdefault(key, [])
+        batch.append((item, fut))
+        if len(batch) == 1:
+            asyncio.get_running_loop().call_later(
+                self.window, lambda: asyncio.ensure_future(self._commit(key))
+            )
+        return await fut
+
+    async def _commit(self, key):
+        batch = self.pending.pop(key, [])
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            await self.io.run(self.flush, key, [item for item, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_result(None)
+
+    async def drain(self):
+        """Commit everything pending now (shutdown)."""
+        for key in list(self.pending):
+            await self._commit(key)
+
+    def stats(self):
+        return {"batches": self.batches, "items": self.items}
+
+
+bot_io = IOPool()
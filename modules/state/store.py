@@ -0,0 +1,271 @@
+# modules/state/store.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ----------------------------------------
+# STATE STORE
+# ----------------------------------------
+DB_FILE = "blt_state.db"
+SCHEMA_VERSION = 1
+
+DEFAULT_BT_STATE = {"last_bt_type": "BT1", "last_bt_date": None}
+DEFAULT_BT_LINE = "Bear Trap in 5 minutes. Prepare squads."
+
+# Files imported once by migrate_json() (left on disk as a backup)
+LEGACY_FILES = {
+    "bt_state": "bt_state.json",
+    "bt_lines": "bt_lines.json",
+    "events": "events.json",
+    "reminders": "event_reminders.json",
+    "dm_sessions": "dm_active.json",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bt_state (
+    id           INTEGER PRIMARY KEY CHECK (id = 1),
+    last_bt_type TEXT NOT NULL,
+    last_bt_date TEXT
+);
+CREATE TABLE IF NOT EXISTS bt_lines (
+    pos  INTEGER PRIMARY KEY,
+    line TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bt_rotation (
+    id         INTEGER PRIMARY KEY CHECK (id = 1),
+    next_index INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_events (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    message        TEXT NOT NULL,
+    hhmm           TEXT NOT NULL,
+    minutes_before INTEGER NOT NULL DEFAULT 0,
+    sent_for_date  TEXT
+);
+CREATE TABLE IF NOT EXISTS dm_sessions (
+    uid         TEXT PRIMARY KEY,
+    mode        TEXT NOT NULL,
+    last_active REAL NOT NULL,
+    count       INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def _read_json(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    try:
+        return json.load(open(path, "r", encoding="utf-8"))
+    except:
+        print(f"[STATE] Skipping unreadable {path}")
+        return None
+
+
+class StateStore:
+    """
+    Bot state in one SQLite database (WAL). Every query runs on a single
+    worker thread, so the event loop never blocks on disk and writes are
+    serialised; each write is one small transaction.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-db")
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._set_meta("schema_version", str(SCHEMA_VERSION))
+
+    # -------------------------
+    # Plumbing
+    # -------------------------
+    async def run(self, fn, *args):
+        """Run a blocking store method on the DB thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _tx(self, fn):
+        """fn(db) inside BEGIN IMMEDIATE … COMMIT (rolled back on error)."""
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self.db)
+            except:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            return out
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return [dict(r) for r in self.db.execute(sql, args).fetchall()]
+
+    def _meta(self, key):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else None
+
+    def _set_meta(self, key, value):
+        self._tx(lambda db: db.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value)))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self.db.close()
+
+    # -------------------------
+    # One-shot JSON migration
+    # -------------------------
+    def migrate_json(self, files=LEGACY_FILES):
+        if self._meta("json_migrated"):
+            return False
+
+        bt_state = _read_json(files["bt_state"])
+        bt_lines = _read_json(files["bt_lines"])
+        events = (_read_json(files["events"]) or []) + (_read_json(files["reminders"]) or [])
+        sessions = _read_json(files["dm_sessions"]) or {}
+        migrated_at = time.time()
+
+        def migrate(db):
+            if isinstance(bt_state, dict) and bt_state.get("last_bt_type"):
+                db.execute(
+                    "INSERT OR REPLACE INTO bt_state (id, last_bt_type, last_bt_date) VALUES (1, ?, ?)",
+                    (bt_state["last_bt_type"], bt_state.get("last_bt_date")))
+            if isinstance(bt_lines, dict) and bt_lines.get("lines"):
+                db.executemany("INSERT OR REPLACE INTO bt_lines (pos, line) VALUES (?, ?)",
+                               list(enumerate(bt_lines["lines"])))
+                db.execute("INSERT OR REPLACE INTO bt_rotation (id, next_index) VALUES (1, ?)",
+                           (int(bt_lines.get("index", 0)),))
+            for evt in events if isinstance(events, list) else []:
+                db.execute(
+                    "INSERT INTO user_events (message, hhmm, minutes_before, sent_for_date) VALUES (?, ?, ?, ?)",
+                    (evt["message"], evt["hhmm"], int(evt.get("minutes_before", 0)), evt.get("sent_for_date")))
+            for uid, s in sessions.items():
+                if s is True:
+                    # Old flag files carry no activity time: start the idle TTL now
+                    s = {"mode": "chat", "last_active": migrated_at, "count": 0}
+                if isinstance(s, dict):
+                    db.execute(
+                        "INSERT OR REPLACE INTO dm_sessions (uid, mode, last_active, count) VALUES (?, ?, ?, ?)",
+                        (str(uid), s["mode"], s["last_active"], s.get("count", 0)))
+            db.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', datetime('now'))")
+
+        self._tx(migrate)
+        print(f"[STATE] Migrated JSON state into {self.path} "
+              f"({len(events)} events, {len(sessions)} DM sessions)")
+        return True
+
+    # -------------------------
+    # BT state
+    # -------------------------
+    def get_bt_state_sync(self):
+        rows = self._query("SELECT last_bt_type, last_bt_date FROM bt_state WHERE id = 1")
+        return rows[0] if rows else dict(DEFAULT_BT_STATE)
+
+    def set_bt_state_sync(self, bt_type, date):
+        self._tx(lambda db: db.execute(
+            "INSERT OR REPLACE INTO bt_state (id, last_bt_type, last_bt_date) VALUES (1, ?, ?)",
+            (bt_type, None if date is None else str(date))))
+
+    async def get_bt_state(self):
+        return await self.run(self.get_bt_state_sync)
+
+    async def set_bt_state(self, bt_type, date):
+        await self.run(self.set_bt_state_sync, bt_type, date)
+
+    # -------------------------
+    # BT reminder line rotation
+    # -------------------------
+    def set_bt_lines_sync(self, lines):
+        def replace(db):
+            db.execute("DELETE FROM bt_lines")
+            db.executemany("INSERT INTO bt_lines (pos, line) VALUES (?, ?)", list(enumerate(lines)))
+            db.execute("INSERT OR REPLACE INTO bt_rotation (id, next_index) VALUES (1, 0)")
+        self._tx(replace)
+
+    def next_bt_line_sync(self):
+        """Line at the rotation index; advances the index in the same transaction."""
+        def rotate(db):
+            lines = [r["line"] for r in db.execute("SELECT line FROM bt_lines ORDER BY pos")]
+            if not lines:
+                return DEFAULT_BT_LINE
+            row = db.execute("SELECT next_index FROM bt_rotation WHERE id = 1").fetchone()
+            idx = row["next_index"] if row else 0
+            db.execute("INSERT OR REPLACE INTO bt_rotation (id, next_index) VALUES (1, ?)",
+                       ((idx + 1) % len(lines),))
+            return lines[idx % len(lines)]
+        return self._tx(rotate)
+
+    async def set_bt_lines(self, lines):
+        await self.run(self.set_bt_lines_sync, lines)
+
+    async def next_bt_line(self):
+        return await self.run(self.next_bt_line_sync)
+
+    # -------------------------
+    # User events
+    # -------------------------
+    def list_events_sync(self):
+        return self._query(
+            "SELECT id, message, hhmm, minutes_before, sent_for_date FROM user_events ORDER BY id")
+
+    def add_event_sync(self, message, hhmm, minutes_before):
+        def add(db):
+            cur = db.execute(
+                "INSERT INTO user_events (message, hhmm, minutes_before) VALUES (?, ?, ?)",
+                (message, hhmm, int(minutes_before)))
+            return cur.lastrowid
+        return self._tx(add)
+
+    def delete_event_sync(self, event_id):
+        self._tx(lambda db: db.execute("DELETE FROM user_events WHERE id = ?", (event_id,)))
+
+    def mark_event_sent_sync(self, event_id, date_str):
+        self._tx(lambda db: db.execute(
+            "UPDATE user_events SET sent_for_date = ? WHERE id = ?", (date_str, event_id)))
+
+    async def list_events(self):
+        return await self.run(self.list_events_sync)
+
+    async def add_event(self, message, hhmm, minutes_before):
+        return await self.run(self.add_event_sync, message, hhmm, minutes_before)
+
+    async def delete_event(self, event_id):
+        await self.run(self.delete_event_sync, event_id)
+
+    async def mark_event_sent(self, event_id, date_str):
+        await self.run(self.mark_event_sent_sync, event_id, date_str)
+
+    # -------------------------
+    # DM sessions
+    # -------------------------
+    def load_sessions_sync(self):
+        return {
+            r["uid"]: {"mode": r["mode"], "last_active": r["last_active"], "count": r["count"]}
+            for r in self._query("SELECT uid, mode, last_active, count FROM dm_sessions")
+        }
+
+    def save_sessions_sync(self, changed, removed):
+        """Upsert `changed` {uid: session} and delete `removed` uids in one transaction."""
+        def save(db):
+            db.executemany(
+                "INSERT INTO dm_sessions (uid, mode, last_active, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(uid) DO UPDATE SET mode = excluded.mode, "
+                "last_active = excluded.last_active, count = excluded.count",
+                [(uid, s["mode"], s["last_active"], s["count"]) for uid, s in changed.items()])
+            db.executemany("DELETE FROM dm_sessions WHERE uid = ?", [(uid,) for uid in removed])
+        self._tx(save)
+
+    async def save_sessions(self, changed, removed):
+        await self.run(self.save_sessions_sync, changed, removed)
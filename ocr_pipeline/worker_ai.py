@@ -1,13 +1,23 @@
 import os
+import re
+import sys
 import json
 import time
-import aiohttp
 import asyncio
 import traceback
 
 BASE = os.path.dirname(os.path.abspath(__file__))
+
+# Share the bot's LLM plumbing (repo root on the import path)
+sys.path.insert(0, os.path.dirname(BASE))
+from modules.llm.health import health_loop, probe_all
+from modules.llm.profiles import profile_params
+from modules.llm.router import route_task
+from modules.llm.scheduler import BACKGROUND
+
 RAW = os.path.join(BASE, "raw")
 OUT = os.path.join(BASE, "processed")
+FAILED = os.path.join(BASE, "failed")     # inputs kept when Qwen could not read them
 LOG = os.path.join(BASE, "logs", "worker_ai.log")
 
 def log(msg):
@@ -15,53 +25,137 @@ def log(msg):
         f.write(msg + "\n")
     print(msg)
 
-async def ask_qwen(text):
+# ------------------------------------------------------------
+# Output grammar (llama-server constrains generation to it)
+# ------------------------------------------------------------
+ROW_RE = re.compile(r"\d[\d,\.]{4,}")    # a damage-sized number on a line
+
+MAX_PLAYERS = 40
+NAME_CHARS = 40             # longest player name accepted
+DAMAGE_DIGITS = 12          # Qwen2.5 spends one token per digit
+
+# Worst case one token per name character and digit; the grammar allows
+# no whitespace, so this bounds the output for `rows` players.
+TOKENS_BASE = 24 + 2 * DAMAGE_DIGITS                # keys, braces, rallies, total_damage
+TOKENS_PER_PLAYER = NAME_CHARS + DAMAGE_DIGITS + 16  # + {"name":"","damage":}, and margin
+MAX_PREDICT = TOKENS_BASE + TOKENS_PER_PLAYER * MAX_PLAYERS
+
+def count_rows(text):
+    """Lines that look like a player row (carry a damage number)."""
+    return sum(1 for line in text.splitlines() if ROW_RE.search(line))
+
+def build_grammar(max_players):
+    """
+    GBNF for compact JSON (no whitespace between tokens):
+    {"rallies":N,"total_damage":N,"players":[{"name":"...","damage":N},...]}
+    A json_schema would let the model spend tokens on newlines and indents.
+    """
+    players = "player" + (f' ("," player){{0,{max_players - 1}}}' if max_players > 1 else "")
+    return "\n".join([
+        r'root ::= "{\"rallies\":" int ",\"total_damage\":" int ",\"players\":[" (' + players + r')? "]}"',
+        r'player ::= "{\"name\":\"" char{1,' + str(NAME_CHARS) + r'} "\",\"damage\":" int "}"',
+        r'char ::= [^"\\\x00-\x1F]',
+        r'int ::= [0-9]{1,' + str(DAMAGE_DIGITS) + "}",
+    ])
+
+def hit_limit(data):
+    """llama-server stopped on n_predict, so the JSON is cut off."""
+    return data.get("stop_type") == "limit" or bool(data.get("stopped_limit"))
+
+def parse_result(content):
+    """Validate the constrained output into {rallies, total_damage, players}; None if unusable."""
+    try:
+        data = json.loads(content)
+        players = [
+            {"name": str(p["name"]).strip(), "damage": int(p["damage"])}
+            for p in data.get("players", [])
+            if str(p.get("name", "")).strip()
+        ]
+        return {
+            "rallies": int(data.get("rallies", 0)),
+            "total_damage": int(data.get("total_damage", 0)),
+            "players": sorted(players, key=lambda p: p["damage"], reverse=True),
+        }
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+async def ask_qwen(text, n_predict):
+    """(content, cut_off): cut_off means the output budget ran out."""
+    rows = min(MAX_PLAYERS, max(1, count_rows(text)))
     try:
-        async with aiohttp.ClientSession() as session:
-            payload = {
-                "prompt": (
-                    "Extract Bear Trap results from raw OCR text.\n"
-                    "Return ONLY JSON with keys:\n"
-                    "{ 'rallies': int, 'total_damage': int, 'players': [ {'name': str, 'damage': int} ] }\n\n"
-                    f"RAW TEXT:\n{text}"
-                ),
-                "n_predict": 300,
-                "temperature": 0.2
-            }
-
-            async with session.post("http://127.0.0.1:8080/completion", json=payload) as r:
-                data = await r.json()
-                return data.get("content", "")
+        payload = {
+            "prompt": (
+                "Extract Bear Trap results from raw OCR text.\n"
+                "Damage values are plain integers without separators.\n\n"
+                f"RAW TEXT:\n{text}\n\nJSON:\n"
+            ),
+            "grammar": build_grammar(rows),
+            **profile_params("extract", n_predict=n_predict),
+        }
+
+        # Small model when configured (LLM_TASK_ROUTES), else the 3B model
+        _, pool, scheduler = route_task("ocr_extract")
+        async with scheduler.slot(BACKGROUND):
+            _, raw = await pool.post("/completion", payload)
+        data = json.loads(raw)
+        return data.get("content", ""), hit_limit(data)
 
     except Exception as e:
-        return "ERROR: " + str(e)
+        return "ERROR: " + str(e), False
+
+def output_budget(text):
+    rows = min(MAX_PLAYERS, max(1, count_rows(text)))
+    return min(MAX_PREDICT, TOKENS_BASE + TOKENS_PER_PLAYER * rows)
 
 async def process_file(path):
+    """True once the result is saved; False leaves the input for failed/."""
     try:
         raw = open(path, "r", encoding="utf-8").read()
 
-        log(f"[AI] Sending OCR text to Qwen → {path}")
-        out = await ask_qwen(raw)
+        n_predict = output_budget(raw)
+        log(f"[AI] Sending OCR text to Qwen ({count_rows(raw)} rows, n_predict={n_predict}) → {path}")
+        out, cut_off = await ask_qwen(raw, n_predict)
+        if cut_off and n_predict < MAX_PREDICT:
+            # Budget problem, not bad input: retry once with the full budget
+            log(f"[AI] Output hit n_predict={n_predict}, retrying with {MAX_PREDICT}")
+            out, cut_off = await ask_qwen(raw, MAX_PREDICT)
+        if cut_off:
+            log(f"[AI] Output still cut off at n_predict={MAX_PREDICT} for {path}")
+            return False
+
+        result = parse_result(out)
+        if result is None:
+            log(f"[AI] Unusable output for {path}: {out[:200]}")
+            return False
 
-        out_path = os.path.join(OUT, os.path.basename(path))
+        out_path = os.path.join(OUT, os.path.basename(path)[:-4] + ".json")
         with open(out_path, "w", encoding="utf-8") as f:
-            f.write(out)
+            json.dump(result, f, ensure_ascii=False, indent=2)
 
-        log(f"[AI] Saved parsed output → {out_path}")
+        log(f"[AI] Saved {len(result['players'])} players → {out_path}")
+        return True
 
     except Exception as e:
         log("[AI] ERROR: " + str(e))
         log(traceback.format_exc())
+        return False
 
 async def loop_main():
     log("=== AI INTERPRETER STARTED ===")
+    # Breakers only reflect reality while something probes the backends
+    await probe_all()
+    asyncio.create_task(health_loop())
 
     while True:
         files = [f for f in os.listdir(RAW) if f.endswith(".txt")]
         for f in files:
             fp = os.path.join(RAW, f)
-            await process_file(fp)
-            os.remove(fp)
+            if await process_file(fp):
+                os.remove(fp)
+            else:
+                os.makedirs(FAILED, exist_ok=True)
+                os.replace(fp, os.path.join(FAILED, f))
+                log(f"[AI] Kept {f} in {FAILED} (move it back to raw/ to retry)")
 
         await asyncio.sleep(1)
 
@@ -0,0 +1,209 @@
+# ========================================================
+# LLM LOAD BENCH — drives the bot's client + scheduler
+# against llama-server (or scripts/mock_llama_server.py)
+#
+#   LLAMA_URL=http://127.0.0.1:8090 python scripts/bench_llm.py -n 40 -c 6
+#   python scripts/bench_llm.py --tasks     # per-task latency, main vs small model
+#   python scripts/bench_llm.py --profiles --out bench_profiles.json
+# ========================================================
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from time import monotonic
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.llm.client import LLAMA_URL, post_json, stream_json, close_session
+from modules.llm.metrics import percentile
+from modules.llm.scheduler import llm_scheduler, SchedulerBusy, CLASS_NAMES
+from modules.llm.router import all_pools, model_for, EMBED
+from modules.llm.pool import llm_pool
+from modules.llm.profiles import PROFILES, profile_params
+
+PROMPT = "You are BLT-bot.\nUser: When does Bear Trap start and what is the rally order?"
+
+# Representative prompt + n_predict per routed task
+TASK_PROMPTS = {
+    "dm": ("You are BLT-bot.\nUser: What makes a good rally leader?", 200),
+    "bt_generate_lines": ("Generate 5 short Bear Trap reminder lines, numbered 1–5.\n", 80),
+    "diary": ("Write a short diary entry about today's alliance activity.\n", 150),
+    "ocr_extract": (
+        "Extract Bear Trap results from raw OCR text.\n\n"
+        "RAW TEXT:\n[BLT]joy46\nDamage Points:231,553,865\n[BLT]HENDO\nDamage Points:245,019,124\n\nJSON:\n",
+        96,
+    ),
+}
+
+
+def _content(raw):
+    """Parsed /completion body; a body without "content" (error JSON) raises."""
+    data = json.loads(raw)
+    if not isinstance(data, dict) or "content" not in data:
+        raise ValueError(f"no content in response: {raw[:80]}")
+    return data
+
+
+async def one(args, priority, results):
+    # Non-2xx answers raise HTTPStatusError in post_json / stream_json;
+    # every failure is counted in "errors" and kept out of the percentiles.
+    payload = {"prompt": PROMPT, "n_predict": args.n_predict, "cache_prompt": True}
+    t0 = monotonic()
+    ttft = None
+    try:
+        async with llm_scheduler.slot(priority):
+            if args.stream:
+                finished = False
+                async for chunk in stream_json(f"{LLAMA_URL}/completion", payload):
+                    if ttft is None and chunk.get("content"):
+                        ttft = monotonic() - t0
+                    if chunk.get("stop"):
+                        finished = True
+                        break
+                if not finished:
+                    raise ValueError("stream ended without a stop chunk")
+            else:
+                _content(await post_json(f"{LLAMA_URL}/completion", payload))
+    except SchedulerBusy:
+        results["rejected"] += 1
+        return
+    except Exception as e:
+        results["errors"].append(str(e) or type(e).__name__)
+        return
+    results["total"].setdefault(priority, []).append(monotonic() - t0)
+    if ttft is not None:
+        results["ttft"].setdefault(priority, []).append(ttft)
+
+
+async def main(args):
+    results = {"total": {}, "ttft": {}, "errors": [], "rejected": 0}
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def run(i):
+        async with sem:
+            await one(args, i % len(CLASS_NAMES), results)
+
+    t0 = monotonic()
+    await asyncio.gather(*(run(i) for i in range(args.requests)))
+    wall = monotonic() - t0
+    await close_session()
+
+    print(f"=== {args.requests} requests, concurrency {args.concurrency}, "
+          f"{'stream' if args.stream else 'blocking'} → {LLAMA_URL} ===")
+    print(f"wall: {wall:.2f}s  errors: {len(results['errors'])}  rejected: {results['rejected']}")
+    for p, name in CLASS_NAMES.items():
+        tot = results["total"].get(p, [])
+        if not tot:
+            continue
+        line = f"{name:12} n={len(tot):3}  total p50 {percentile(tot, 50)*1000:7.0f}ms  p95 {percentile(tot, 95)*1000:7.0f}ms"
+        ttft = results["ttft"].get(p, [])
+        if ttft:
+            line += f"  ttft p50 {percentile(ttft, 50)*1000:6.0f}ms  p95 {percentile(ttft, 95)*1000:6.0f}ms"
+        print(line)
+    for err in results["errors"][:5]:
+        print("  error:", err)
+
+
+# Fixed prompt set every profile is measured against
+PROFILE_PROMPTS = [
+    "You are BLT-bot.\nUser: What makes a good rally leader?",
+    "You are BLT-bot.\nUser: Summarise tonight's Bear Trap in two sentences.",
+    "Write a short diary entry about today's alliance activity.\n",
+]
+
+
+async def profile_report(args):
+    """Each generation profile over PROFILE_PROMPTS on the main model."""
+    print(f"=== generation profiles, {args.repeat} runs per prompt ===")
+    report = {}
+    for name in PROFILES:
+        totals, tps, n_out, chars, errors = [], [], [], [], 0
+        for prompt in PROFILE_PROMPTS:
+            for _ in range(args.repeat):
+                payload = {"prompt": prompt, "cache_prompt": True, **profile_params(name)}
+                t0 = monotonic()
+                try:
+                    _, raw = await llm_pool.post("/completion", payload)
+                    data = _content(raw)
+                except Exception:
+                    errors += 1
+                    continue
+                totals.append(monotonic() - t0)
+                timings = data.get("timings") or {}
+                if timings.get("predicted_per_second"):
+                    tps.append(timings["predicted_per_second"])
+                n_out.append(timings.get("predicted_n", data.get("tokens_predicted", 0)))
+                chars.append(len(data.get("content", "")))
+        if not totals:
+            print(f"{name:10} unavailable ({errors} errors)")
+            continue
+        row = {
+            "n_predict": PROFILES[name]["n_predict"],
+            "total_p50_ms": round(percentile(totals, 50) * 1000),
+            "total_p95_ms": round(percentile(totals, 95) * 1000),
+            "gen_tps_p50": round(percentile(tps, 50), 1),
+            "tokens_avg": round(sum(n_out) / len(n_out), 1),
+            "chars_avg": round(sum(chars) / len(chars), 1),
+            "errors": errors,
+        }
+        report[name] = row
+        print(f"{name:10} n_predict {row['n_predict']:4}  total p50 {row['total_p50_ms']:7}ms  "
+              f"p95 {row['total_p95_ms']:7}ms  gen {row['gen_tps_p50']:6} t/s  "
+              f"out {row['tokens_avg']:6} tok / {row['chars_avg']:7} chars")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print("saved →", args.out)
+    await close_session()
+
+
+async def task_report(args):
+    """Each task's prompt on every configured model, sequentially (no contention)."""
+    print(f"=== per-task latency, {args.repeat} runs each ===")
+    for task, (prompt, n_predict) in TASK_PROMPTS.items():
+        for model, pool in all_pools():
+            if model == EMBED:
+                continue
+            totals, tps, errors = [], [], 0
+            for _ in range(args.repeat):
+                payload = {"prompt": prompt, "n_predict": n_predict, "cache_prompt": True}
+                t0 = monotonic()
+                try:
+                    _, raw = await pool.post("/completion", payload)
+                    data = _content(raw)
+                except Exception:
+                    errors += 1
+                    continue
+                totals.append(monotonic() - t0)
+                rate = (data.get("timings") or {}).get("predicted_per_second")
+                if rate:
+                    tps.append(rate)
+            routed = "*" if model_for(task) == model else " "
+            if not totals:
+                print(f"{routed}{task:18} {model:6} unavailable ({errors} errors)")
+                continue
+            print(f"{routed}{task:18} {model:6} total p50 {percentile(totals, 50)*1000:7.0f}ms  "
+                  f"p95 {percentile(totals, 95)*1000:7.0f}ms  gen p50 {percentile(tps, 50):6.1f} t/s"
+                  + (f"  errors {errors}" if errors else ""))
+    print("* = model the task is currently routed to")
+    await close_session()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Load-test the LLM client path.")
+    p.add_argument("-n", "--requests", type=int, default=20)
+    p.add_argument("-c", "--concurrency", type=int, default=4)
+    p.add_argument("--n-predict", type=int, default=64)
+    p.add_argument("--stream", action="store_true")
+    p.add_argument("--tasks", action="store_true", help="compare per-task latency across models")
+    p.add_argument("--profiles", action="store_true", help="benchmark each generation profile")
+    p.add_argument("--repeat", type=int, default=5, help="runs per task/model or profile/prompt")
+    p.add_argument("--out", help="write the --profiles report as JSON")
+    args = p.parse_args()
+    if args.profiles:
+        asyncio.run(profile_report(args))
+    elif args.tasks:
+        asyncio.run(task_report(args))
+    else:
+        asyncio.run(main(args))
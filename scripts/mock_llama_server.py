@@ -0,0 +1,281 @@
+# ========================================================
+# MOCK LLAMA-SERVER — offline stand-in for benchmarking
+# Same JSON shapes as llama.cpp's server for the routes
+# BLT-bot uses: /completion (+stream), /tokenize,
+# /detokenize, /embedding, /health, /slots,
+# /slots/{id}?action=save|restore|erase
+#
+#   python scripts/mock_llama_server.py --port 8080 --slots 2
+#   LLAMA_URL=http://127.0.0.1:8090 python bot.py
+# ========================================================
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import zlib
+
+from aiohttp import web
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]|\s+")
+EMBED_DIM = 256
+
+FILLER = (
+    "Squads hold formation while the rally timer settles . "
+    "Clarity before action keeps the bear trap clean . "
+    "Hero sync matters more than raw power today . "
+).split()
+
+
+# -----------------------------
+# Deterministic toy tokenizer
+# -----------------------------
+class Vocab:
+    def __init__(self):
+        self.pieces = {}
+
+    def encode(self, text):
+        ids = []
+        for piece in TOKEN_RE.findall(text):
+            tid = zlib.crc32(piece.encode("utf-8")) % 150000
+            self.pieces[tid] = piece
+            ids.append(tid)
+        return ids
+
+    def decode(self, ids):
+        return "".join(self.pieces.get(i, "") for i in ids)
+
+
+# -----------------------------
+# Slot model (prompt cache per slot)
+# -----------------------------
+class Slot:
+    def __init__(self, sid, n_ctx):
+        self.id = sid
+        self.n_ctx = n_ctx
+        self.busy = False
+        self.cached = []        # token ids of the last prompt
+        self.lock = asyncio.Lock()
+
+    def json(self):
+        return {
+            "id": self.id,
+            "n_ctx": self.n_ctx,
+            "is_processing": self.busy,
+            "n_past": len(self.cached),
+        }
+
+
+class MockServer:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.vocab = Vocab()
+        self.slots = [Slot(i, args.ctx // args.slots) for i in range(args.slots)]
+        self.started = time.monotonic()
+
+    # -------------------------
+    # Helpers
+    # -------------------------
+    def loading(self):
+        return time.monotonic() - self.started < self.args.load_seconds
+
+    async def pick_slot(self, wanted):
+        if wanted is not None and 0 <= int(wanted) < len(self.slots):
+            return self.slots[int(wanted)]
+        free = [s for s in self.slots if not s.busy]
+        return free[0] if free else min(self.slots, key=lambda s: len(s.cached))
+
+    async def maybe_fail(self):
+        """Returns an error response, hangs, or None for a normal request."""
+        roll = self.rng.random()
+        if roll < self.args.fail_rate:
+            return web.json_response({"error": {"code": 500, "message": "injected failure"}}, status=500)
+        if roll < self.args.fail_rate + self.args.hang_rate:
+            await asyncio.sleep(self.args.hang_seconds)
+        return None
+
+    def prompt_cost(self, slot, ids, cache_prompt):
+        """Tokens that actually need evaluating, given the slot's cached prefix."""
+        if not cache_prompt:
+            return len(ids)
+        common = 0
+        for a, b in zip(slot.cached, ids):
+            if a != b:
+                break
+            common += 1
+        return len(ids) - common
+
+    def reply_tokens(self, n):
+        words = [self.rng.choice(FILLER) for _ in range(n)]
+        return [(" " if i else "") + w for i, w in enumerate(words)]
+
+    # -------------------------
+    # Routes
+    # -------------------------
+    async def health(self, request):
+        if self.loading():
+            return web.json_response({"error": {"code": 503, "message": "Loading model"}}, status=503)
+        return web.json_response({"status": "ok"})
+
+    async def slots_route(self, request):
+        return web.json_response([s.json() for s in self.slots])
+
+    async def slot_action(self, request):
+        """Save/restore a slot's cached tokens like --slot-save-path does."""
+        if not self.args.slot_save_path:
+            return web.json_response(
+                {"error": {"code": 501, "message": "This server does not support slots action."}}, status=501)
+
+        sid = int(request.match_info["id"])
+        if not 0 <= sid < len(self.slots):
+            return web.json_response({"error": {"code": 400, "message": "Invalid slot ID"}}, status=400)
+        slot = self.slots[sid]
+        action = request.query.get("action")
+        body = await request.json() if action in ("save", "restore") else {}
+        path = os.path.join(self.args.slot_save_path, os.path.basename(body.get("filename", "")))
+
+        t0 = time.monotonic()
+        if action == "save":
+            with open(path, "w") as f:
+                json.dump(slot.cached, f)
+            return web.json_response({"id_slot": sid, "filename": body["filename"], "n_saved": len(slot.cached),
+                                      "timings": {"save_ms": (time.monotonic() - t0) * 1000}})
+        if action == "restore":
+            if not os.path.exists(path):
+                return web.json_response({"error": {"code": 400, "message": "failed to restore slot"}}, status=400)
+            slot.cached = json.load(open(path))
+            return web.json_response({"id_slot": sid, "filename": body["filename"], "n_restored": len(slot.cached),
+                                      "timings": {"restore_ms": (time.monotonic() - t0) * 1000}})
+        if action == "erase":
+            n = len(slot.cached)
+            slot.cached = []
+            return web.json_response({"id_slot": sid, "n_erased": n})
+        return web.json_response({"error": {"code": 400, "message": "Invalid action"}}, status=400)
+
+    async def tokenize(self, request):
+        body = await request.json()
+        return web.json_response({"tokens": self.vocab.encode(body.get("content", ""))})
+
+    async def detokenize(self, request):
+        body = await request.json()
+        return web.json_response({"content": self.vocab.decode(body.get("tokens", []))})
+
+    async def embedding(self, request):
+        """Hashed bag-of-words vector: same words → same direction. `content` may be a list."""
+        body = await request.json()
+        content = body.get("content", "")
+        out = []
+        for i, text in enumerate(content if isinstance(content, list) else [content]):
+            vec = [0.0] * EMBED_DIM
+            for word in re.findall(r"\w+", text.lower()):
+                vec[zlib.crc32(word.encode("utf-8")) % EMBED_DIM] += 1.0
+            out.append({"index": i, "embedding": vec})
+        return web.json_response(out)
+
+    async def completion(self, request):
+        if self.loading():
+            return await self.health(request)
+
+        body = await request.json()
+        failed = await self.maybe_fail()
+        if failed is not None:
+            return failed
+
+        ids = self.vocab.encode(body.get("prompt", ""))
+        n_predict = int(body.get("n_predict", body.get("max_tokens", 128)))
+        if n_predict < 0:
+            n_predict = 128
+        stream = bool(body.get("stream"))
+
+        slot = await self.pick_slot(body.get("id_slot"))
+        async with slot.lock:
+            slot.busy = True
+            try:
+                return await self._generate(request, slot, ids, n_predict, stream,
+                                            body.get("cache_prompt", True))
+            finally:
+                slot.busy = False
+
+    async def _generate(self, request, slot, ids, n_predict, stream, cache_prompt):
+        a = self.args
+        t0 = time.monotonic()
+
+        n_eval = self.prompt_cost(slot, ids, cache_prompt)
+        prompt_ms = a.prompt_base_ms + n_eval * a.prompt_ms_per_token
+        await asyncio.sleep(prompt_ms / 1000)
+        slot.cached = ids
+
+        pieces = self.reply_tokens(n_predict)
+
+        def timings():
+            predicted_ms = (time.monotonic() - t0) * 1000 - prompt_ms
+            return {
+                "prompt_n": n_eval,
+                "prompt_ms": round(prompt_ms, 3),
+                "prompt_per_second": round(n_eval / (prompt_ms / 1000), 3) if prompt_ms else 0,
+                "predicted_n": len(pieces),
+                "predicted_ms": round(predicted_ms, 3),
+                "predicted_per_second": round(len(pieces) / (predicted_ms / 1000), 3) if predicted_ms > 0 else 0,
+            }
+
+        final = {
+            "stop": True,
+            "id_slot": slot.id,
+            "tokens_evaluated": len(ids),
+            "tokens_predicted": len(pieces),
+            "tokens_cached": len(ids) - n_eval,
+            "stop_type": "limit",
+        }
+
+        if not stream:
+            await asyncio.sleep(len(pieces) * a.token_ms / 1000)
+            return web.json_response(dict(final, content="".join(pieces), timings=timings()))
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for piece in pieces:
+            await asyncio.sleep(a.token_ms / 1000)
+            chunk = {"content": piece, "stop": False, "id_slot": slot.id}
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await resp.write(f"data: {json.dumps(dict(final, content='', timings=timings()))}\n\n".encode("utf-8"))
+        await resp.write_eof()
+        return resp
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/slots", self.slots_route)
+        app.router.add_post("/slots/{id}", self.slot_action)
+        app.router.add_post("/tokenize", self.tokenize)
+        app.router.add_post("/detokenize", self.detokenize)
+        app.router.add_post("/embedding", self.embedding)
+        app.router.add_post("/completion", self.completion)
+        return app
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Mock llama-server for offline BLT-bot benchmarks.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8090)
+    p.add_argument("--slots", type=int, default=2, help="like --parallel")
+    p.add_argument("--ctx", type=int, default=8192, help="like -c (split across slots)")
+    p.add_argument("--prompt-base-ms", type=float, default=20.0)
+    p.add_argument("--prompt-ms-per-token", type=float, default=4.0)
+    p.add_argument("--token-ms", type=float, default=120.0, help="per generated token")
+    p.add_argument("--load-seconds", type=float, default=0.0, help="answer 503 'loading' this long after start")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="fraction of completions answered with HTTP 500")
+    p.add_argument("--hang-rate", type=float, default=0.0, help="fraction of completions that stall first")
+    p.add_argument("--hang-seconds", type=float, default=300.0)
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--slot-save-path", default=None, help="enables /slots/{id}?action=save|restore")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"Mock llama-server on http://{args.host}:{args.port} ({args.slots} slots)")
+    web.run_app(MockServer(args).app(), host=args.host, port=args.port, print=None)
@@ -3,10 +3,19 @@ import asyncio
 import datetime
 from discord.ext import tasks
 
-from config import DISCORD_TOKEN
-import requests
 import json
 import os
+import sys
+
+# Repo root on the import path (config + shared LLM plumbing)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DISCORD_TOKEN
+from modules.llm.health import health_loop, probe_all
+from modules.llm.profiles import profile_params
+from modules.llm.router import route_task
+from modules.llm.scheduler import SchedulerBusy, BACKGROUND
+from modules.llm.pregen import PregenEngine, PregenStore, next_daily
+from modules.state.aio import bot_io
 
 CHANNEL_ID = 1376409374263873546   # <<< SET THIS to the channel ID where announcements go.
 
@@ -15,16 +24,17 @@ CHANNEL_ID = 1376409374263873546   # <<< SET THIS to the channel ID where announ
 # Helper: send a message to Qwen server
 # -----------------------------
 
-def ask_qwen(prompt):
-    url = "http://127.0.0.1:8080/completion"
-    payload = {
-        "prompt": prompt,
-        "max_tokens": 400,
-        "temperature": 0.55
-    }
-    r = requests.post(url, json=payload)
+QWEN_FAILED = ("No response.", "Qwen is busy.", "Error contacting Qwen.")
+
+async def ask_qwen(prompt):
+    payload = {"prompt": prompt, **profile_params("summary")}
+    _, pool, scheduler = route_task("schedule_summary")
     try:
-        return r.json().get("content", "No response.")
+        async with scheduler.slot(BACKGROUND):
+            _, raw = await pool.post("/completion", payload)
+        return json.loads(raw).get("content", "No response.")
+    except SchedulerBusy:
+        return "Qwen is busy."
     except:
         return "Error contacting Qwen."
 
@@ -64,25 +74,49 @@ client = discord.Client(intents=intents)
 # Scheduled tasks
 # -----------------------------
 
+# Example scheduled times:
+# 12:00 midday summary
+# 20:00 event reminder
+# 00:00 daily reset summary
+
+SCHEDULE_MAP = {
+    "12:00": "Provide a midday BLT status summary.",
+    "20:00": "Provide an evening event reminder for all BLT members.",
+    "00:00": "Provide a daily BLT reset summary."
+}
+
+
+async def generate_summary(request):
+    ctx = build_context()
+    prompt = ctx + f"\n\nUser Request: {request}"
+    return await ask_qwen(prompt)
+
+
+# -----------------------------
+# Pre-generation (summaries are built while Qwen is idle,
+# up to 20 minutes before they are due)
+# -----------------------------
+
+pregen = PregenEngine(PregenStore("pregen_schedule.json"))
+
+def _register_summary(hhmm, request):
+    async def build():
+        msg = await generate_summary(request)
+        return None if msg in QWEN_FAILED else msg
+
+    pregen.register(f"summary-{hhmm}", build, ttl=3600,
+                    next_due=lambda: next_daily(hhmm), lead=20 * 60)
+
+for _hhmm, _request in SCHEDULE_MAP.items():
+    _register_summary(_hhmm, _request)
+
+
 @tasks.loop(minutes=1)
 async def scheduler_task():
     now = datetime.datetime.now().strftime("%H:%M")
 
-    # Example scheduled times:
-    # 12:00 midday summary
-    # 20:00 event reminder
-    # 00:00 daily reset summary
-
-    schedule_map = {
-        "12:00": "Provide a midday BLT status summary.",
-        "20:00": "Provide an evening event reminder for all BLT members.",
-        "00:00": "Provide a daily BLT reset summary."
-    }
-
-    if now in schedule_map:
-        ctx = build_context()
-        prompt = ctx + f"\n\nUser Request: {schedule_map[now]}"
-        msg = ask_qwen(prompt)
+    if now in SCHEDULE_MAP:
+        msg = await bot_io.run(pregen.take, f"summary-{now}") or await generate_summary(SCHEDULE_MAP[now])
 
         channel = client.get_channel(CHANNEL_ID)
         if channel:
@@ -93,6 +127,10 @@ async def scheduler_task():
 async def on_ready():
     print(f"Scheduler logged in as {client.user}")
     scheduler_task.start()
+    # Breakers only reflect reality while something probes the backends
+    await probe_all()
+    asyncio.create_task(health_loop())
+    asyncio.create_task(pregen.loop())
 
 
 client.run(DISCORD_TOKEN)
@@ -16,9 +16,16 @@ PY="/data/data/com.termux/files/usr/bin/python3"
 
 mkdir -p "$LOGDIR"
 mkdir -p "$OCR/incoming" "$OCR/raw" "$OCR/results"
+# llama-server KV slot snapshots (bot saves/restores them, see modules/llm/kvstate.py)
+KV_SLOTS="$BASE/kv_slots"
+mkdir -p "$KV_SLOTS"
 
 QWEN_BIN="/data/data/com.termux/files/home/llama.cpp/build/bin/llama-server"
 MODEL="/data/data/com.termux/files/home/models/Qwen2.5-3B-Instruct-Q4_K_M.gguf"
+# Small model for utility tasks (LLM_TASK_ROUTES in config.py); skipped if absent
+SMALL_MODEL="/data/data/com.termux/files/home/models/Qwen2.5-0.5B-Instruct-Q4_K_M.gguf"
+# Embedding model for the semantic DM cache; skipped if absent
+EMBED_MODEL="/data/data/com.termux/files/home/models/nomic-embed-text-v1.5.Q4_K_M.gguf"
 
 echo "=== Inside tmux: BLT-bot startup ==="
 echo "Date: $(date)"
@@ -45,11 +52,39 @@ echo "[1/5] Starting Qwen..."
   -c 8192 -t 6 \
   -ngl 12 \
   --parallel 2 --cont-batching --mlock --no-mmap \
+  --slot-save-path "$KV_SLOTS" \
   --port 8080 \
   >> "$LOGDIR/qwen.log" 2>&1 &
 sleep 3
 echo "Qwen started."
 
+if [ -f "$SMALL_MODEL" ]; then
+  echo "[1b/5] Starting small Qwen (utility tasks)..."
+  "$QWEN_BIN" \
+    -m "$SMALL_MODEL" \
+    -c 4096 -t 2 \
+    --parallel 2 --cont-batching \
+    --port 8081 \
+    >> "$LOGDIR/qwen_small.log" 2>&1 &
+  sleep 1
+  echo "Small Qwen started."
+else
+  echo "[1b/5] No small model at $SMALL_MODEL — utility tasks stay on the 3B model."
+fi
+
+if [ -f "$EMBED_MODEL" ]; then
+  echo "[1c/5] Starting embedding server (DM cache)..."
+  "$QWEN_BIN" \
+    -m "$EMBED_MODEL" \
+    --embedding -c 512 -t 1 \
+    --port 8083 \
+    >> "$LOGDIR/embed.log" 2>&1 &
+  sleep 1
+  echo "Embedding server started."
+else
+  echo "[1c/5] No embedding model at $EMBED_MODEL — DM cache disabled."
+fi
+
 ###################################################
 # 2) Local API
 ###################################################
@@ -0,0 +1,81 @@
+# tests/test_aio.py
+import asyncio
+
+from modules.state.aio import GroupCommit, IOPool
+
+
+def test_group_commit_batches_per_key():
+    flushed = []
+    io = IOPool(max_workers=1)
+    commits = GroupCommit(io, lambda key, items: flushed.append((key, items)), window=0.05)
+
+    async def main():
+        await asyncio.gather(
+            commits.submit("a", 1),
+            commits.submit("a", 2),
+            commits.submit("b", 3),
+            commits.submit("a", 4),
+        )
+
+    try:
+        asyncio.run(main())
+    finally:
+        io.close()
+
+    assert sorted(flushed) == [("a", [1, 2, 4]), ("b", [3])]
+    assert commits.stats() == {"batches": 2, "items": 4}
+
+
+def test_group_commit_separate_windows():
+    flushed = []
+    io = IOPool(max_workers=1)
+    commits = GroupCommit(io, lambda key, items: flushed.append(items), window=0.01)
+
+    async def main():
+        await commits.submit("a", 1)
+        await commits.submit("a", 2)
+
+    try:
+        asyncio.run(main())
+    finally:
+        io.close()
+
+    assert flushed == [[1], [2]]
+
+
+def test_group_commit_raises_flush_error_to_every_submitter():
+    def flush(key, items):
+        raise OSError("disk full")
+
+    io = IOPool(max_workers=1)
+    commits = GroupCommit(io, flush, window=0.01)
+
+    async def main():
+        return await asyncio.gather(
+            commits.submit("a", 1), commits.submit("a", 2), return_exceptions=True)
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        io.close()
+
+    assert [type(r) for r in results] == [OSError, OSError]
+
+
+def test_drain_commits_pending_now():
+    flushed = []
+    io = IOPool(max_workers=1)
+    commits = GroupCommit(io, lambda key, items: flushed.append(items), window=60)
+
+    async def main():
+        task = asyncio.ensure_future(commits.submit("a", 1))
+        await asyncio.sleep(0)
+        await commits.drain()
+        await asyncio.wait_for(task, 1)
+
+    try:
+        asyncio.run(main())
+    finally:
+        io.close()
+
+    assert flushed == [[1]]
@@ -0,0 +1,116 @@
+# tests/test_memlog.py
+import json
+import os
+
+from modules.chat.memlog import COMPACT_MIN_SEGMENTS, ChatLog
+
+
+def _texts(turns):
+    return [(t["role"], t["text"]) for t in turns]
+
+
+def test_legacy_txt_is_migrated_once(tmp_path):
+    (tmp_path / "42.txt").write_text(
+        "chopped tail of an old answer\n"
+        "User: hi\n"
+        "Bot: hello\nsecond line\n"
+        "User: bear trap?\n"
+        "Bot: Tuesday 20:00\n",
+        encoding="utf-8",
+    )
+    log = ChatLog(str(tmp_path))
+
+    expected = [
+        ("bot", "chopped tail of an old answer"),
+        ("user", "hi"),
+        ("bot", "hello\nsecond line"),
+        ("user", "bear trap?"),
+        ("bot", "Tuesday 20:00"),
+    ]
+    assert _texts(log.history("42")) == expected
+    assert log.turn_count("42") == 5
+    assert not (tmp_path / "42.txt").exists()
+    assert (tmp_path / "42.txt.migrated").exists()
+
+    # New turns go after the imported ones; a fresh instance reads the same log
+    log.append("42", [("user", "thanks"), ("bot", "np")])
+    again = ChatLog(str(tmp_path))
+    assert _texts(again.history("42")) == expected + [("user", "thanks"), ("bot", "np")]
+    assert _texts(again.recent("42", 2)) == [("user", "thanks"), ("bot", "np")]
+
+
+def test_compaction_keeps_history_and_recent(tmp_path):
+    log = ChatLog(str(tmp_path), segment_bytes=200, recent_turns=4)
+    turns = [("user" if i % 2 == 0 else "bot", f"turn {i} " + "x" * 60) for i in range(40)]
+    for i in range(0, len(turns), 2):
+        log.append("7", turns[i:i + 2])
+
+    before = _texts(log.history("7"))
+    assert before == turns
+
+    merged = log.compact("7")
+    assert merged >= COMPACT_MIN_SEGMENTS
+    names = os.listdir(tmp_path / "7")
+    assert sum(n.startswith("archive-") for n in names) == 1
+
+    assert _texts(log.history("7")) == turns
+    assert _texts(log.recent("7", 4)) == turns[-4:]
+    assert log.turn_count("7") == len(turns)
+
+    # Index rebuilt from the files gives the same view
+    os.remove(tmp_path / "7" / "index.json")
+    rebuilt = ChatLog(str(tmp_path), segment_bytes=200, recent_turns=4)
+    assert _texts(rebuilt.history("7")) == turns
+    assert _texts(rebuilt.recent("7", 4)) == turns[-4:]
+    assert rebuilt.turn_count("7") == len(turns)
+
+
+def test_compaction_needs_enough_sealed_segments(tmp_path):
+    log = ChatLog(str(tmp_path))
+    log.append("1", [("user", "hi"), ("bot", "hello")])
+    assert log.compact("1") == 0
+    assert _texts(log.history("1")) == [("user", "hi"), ("bot", "hello")]
+
+
+def test_compaction_waits_for_history_readers(tmp_path):
+    log = ChatLog(str(tmp_path), segment_bytes=200, recent_turns=4)
+    turns = [("user" if i % 2 == 0 else "bot", f"turn {i} " + "x" * 60) for i in range(40)]
+    for i in range(0, len(turns), 2):
+        log.append("7", turns[i:i + 2])
+
+    reader = log.history("7")
+    first = next(reader)
+    assert log.compact("7") >= COMPACT_MIN_SEGMENTS
+
+    # The reader still sees every turn from the segments it started with
+    assert _texts([first] + list(reader)) == turns
+    assert not any(n.startswith("seg-000001") for n in os.listdir(tmp_path / "7"))
+    assert _texts(log.history("7")) == turns
+
+
+def test_missing_segment_is_skipped(tmp_path):
+    log = ChatLog(str(tmp_path), segment_bytes=200)
+    for i in range(6):
+        log.append("3", [("user", f"q{i} " + "x" * 80), ("bot", f"a{i} " + "y" * 80)])
+    os.remove(tmp_path / "3" / "seg-000001.jsonl")
+
+    texts = [t["text"] for t in log.history("3")]
+    assert texts and not texts[0].startswith("q0 ")
+
+
+def test_turns_reads_a_range_across_segments_and_archives(tmp_path):
+    log = ChatLog(str(tmp_path), segment_bytes=200, recent_turns=4)
+    turns = [("user" if i % 2 == 0 else "bot", f"turn {i} " + "x" * 60) for i in range(40)]
+    for i in range(0, len(turns), 2):
+        log.append("7", turns[i:i + 2])
+
+    assert _texts(log.turns("7", 5, 7)) == turns[5:12]
+    log.compact("7")
+    assert _texts(log.turns("7", 5, 7)) == turns[5:12]
+    assert _texts(log.turns("7", 36, 10)) == turns[36:]
+
+    # Index from before per-segment counts: counted once, same answer
+    index = json.loads((tmp_path / "7" / "index.json").read_text())
+    del index["counts"]
+    (tmp_path / "7" / "index.json").write_text(json.dumps(index))
+    assert _texts(ChatLog(str(tmp_path)).turns("7", 5, 7)) == turns[5:12]
@@ -0,0 +1,69 @@
+# tests/test_store.py
+import json
+import time
+
+from modules.state.store import LEGACY_FILES, StateStore
+
+
+def _legacy(tmp_path, sessions):
+    data = {
+        "bt_state": {"last_bt_type": "BT2", "last_bt_date": "2026-01-05"},
+        "bt_lines": {"lines": ["one", "two", "three"], "index": 1},
+        "events": [{"message": "KvK", "hhmm": "20:00", "minutes_before": 10}],
+        "reminders": [{"message": "Vikings", "hhmm": "18:30"}],
+        "dm_sessions": sessions,
+    }
+    files = {}
+    for key, name in LEGACY_FILES.items():
+        path = tmp_path / name
+        path.write_text(json.dumps(data[key]), encoding="utf-8")
+        files[key] = str(path)
+    return files
+
+
+def test_migrate_json_imports_once(tmp_path):
+    files = _legacy(tmp_path, {
+        "1": {"mode": "chat", "last_active": 100.0, "count": 3},
+        "2": True,
+    })
+    store = StateStore(str(tmp_path / "state.db"))
+    try:
+        assert store.migrate_json(files) is True
+        # Second run (next start) is a no-op: nothing duplicated
+        assert store.migrate_json(files) is False
+
+        assert store.get_bt_state_sync() == {"last_bt_type": "BT2", "last_bt_date": "2026-01-05"}
+        assert [e["message"] for e in store.list_events_sync()] == ["KvK", "Vikings"]
+        assert store.next_bt_line_sync() == "two"
+
+        sessions = store.load_sessions_sync()
+        assert sessions["1"] == {"mode": "chat", "last_active": 100.0, "count": 3}
+        assert sessions["2"]["mode"] == "chat"
+    finally:
+        store.close()
+
+
+def test_legacy_flag_session_starts_at_migration_time(tmp_path):
+    files = _legacy(tmp_path, {"2": True})
+    store = StateStore(str(tmp_path / "state.db"))
+    try:
+        before = time.time()
+        store.migrate_json(files)
+        assert store.load_sessions_sync()["2"]["last_active"] >= before
+    finally:
+        store.close()
+
+
+def test_migration_survives_reopen(tmp_path):
+    files = _legacy(tmp_path, {})
+    path = str(tmp_path / "state.db")
+    store = StateStore(path)
+    store.migrate_json(files)
+    store.close()
+
+    reopened = StateStore(path)
+    try:
+        assert reopened.migrate_json(files) is False
+        assert len(reopened.list_events_sync()) == 2
+    finally:
+        reopened.close()
@@ -0,0 +1,25 @@
+# tests/test_summarize.py
+from modules.chat.memlog import ChatLog
+from modules.chat.summarize import MemorySummarizer
+
+
+def _summarizer(tmp_path):
+    return MemorySummarizer(ChatLog(str(tmp_path)), io=None, generate=None, is_idle=None)
+
+
+def test_chunk_ends_before_a_user_turn(tmp_path):
+    s = _summarizer(tmp_path)
+    # Migrated log: starts with a bot turn (text cut by the old cap)
+    s.chat_log.append("9", [("bot", "tail")] + [(r, "x") for r in ["user", "bot"] * 5])
+
+    chunk = s._chunk("9", 0, 4)
+    assert [t["role"] for t in chunk] == ["bot", "user", "bot"]
+
+    nxt = s._chunk("9", len(chunk), 4)
+    assert [t["role"] for t in nxt] == ["user", "bot", "user", "bot"]
+
+
+def test_chunk_without_a_user_boundary_keeps_n(tmp_path):
+    s = _summarizer(tmp_path)
+    s.chat_log.append("9", [("bot", "a"), ("bot", "b"), ("bot", "c")])
+    assert len(s._chunk("9", 0, 2)) == 2